@@ -8,27 +8,44 @@ import os
 import json
 import logging
 from datetime import datetime
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, Response, stream_with_context, g
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 import openai
 from dotenv import load_dotenv
-import requests
 import re
-import sqlite3
+import csv
+import uuid
+import time
+import random
+import math
+import cProfile
 from typing import Dict, Any, Optional
-
-print("=== THIS IS THE CORRECT APP.PY ===")
+from rate_limiter import TokenBucketLimiter, SQLiteTokenBucketLimiter
+from faq_index import FAQIndex
+from amortization import (
+    amortization_schedule, PERIODS_PER_YEAR, SCHEDULE_COLUMNS,
+    MAX_ANNUAL_RATE, MAX_PRINCIPAL, MAX_AMORTIZATION_YEARS
+)
+import numpy as np
+from lead_export import EXPORTERS, EXPORT_FORMATS, COMPRESSION_EXTENSIONS, compress_chunks, zstandard
+from profiling import ProfileStore, collapsed_stacks, verify_profile_signature
+from storage import SQLiteLeadStore, InMemoryLeadStore, DEFAULT_RATES, ANONYMOUS_SESSION_ID
+from event_log import EventLogger
+from idempotency import IdempotencyCache, IN_PROGRESS
+from http_client import PooledHTTPClient
+from qualification import QualificationFlow
 
 # Load environment variables
 load_dotenv()
 
-print("API Key loaded:", os.getenv('OPENAI_API_KEY'))
-
 # Initialize Flask app
 app = Flask(__name__)
+# Trust the last TRUSTED_PROXY_HOPS X-Forwarded-For entries (Render's proxy appends one); earlier entries are client-supplied
+app.wsgi_app = ProxyFix(app.wsgi_app, x_for=int(os.getenv('TRUSTED_PROXY_HOPS', 1)))
 
 # Configure CORS (adjust for production)
-CORS(app, origins=["*"], methods=["POST", "GET", "OPTIONS"], allow_headers=["Content-Type"])
+CORS(app, origins=["*"], methods=["POST", "GET", "OPTIONS"], allow_headers=["Content-Type", "Idempotency-Key"], expose_headers=["Retry-After", "X-Profile-Id", "Idempotent-Replayed"])
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -43,6 +60,68 @@ if not OPENAI_API_KEY:
 # Initialize OpenAI client
 openai.api_key = OPENAI_API_KEY
 
+# Outbound HTTP (OpenAI, Calendly) shares one keep-alive pool per host in each worker.
+# Read timeouts are set per call; connect timeout and retries apply to every call.
+http_client = PooledHTTPClient(
+    pool_connections=int(os.getenv('HTTP_POOL_CONNECTIONS', 10)),
+    pool_maxsize=int(os.getenv('HTTP_POOL_MAXSIZE', 10)),
+    connect_timeout=float(os.getenv('HTTP_CONNECT_TIMEOUT', 3.05)),
+    retries=int(os.getenv('HTTP_RETRIES', 2)),
+    backoff_factor=float(os.getenv('HTTP_BACKOFF_FACTOR', 0.25)),
+    max_retry_after=float(os.getenv('HTTP_MAX_RETRY_AFTER', 2))
+)
+OPENAI_READ_TIMEOUT = float(os.getenv('OPENAI_READ_TIMEOUT', 30))
+CALENDLY_READ_TIMEOUT = float(os.getenv('CALENDLY_READ_TIMEOUT', 10))
+# openai 0.28 otherwise builds its own session per thread and replaces it every 3 minutes
+openai.requestssession = http_client.session
+
+# Rate limiting - separate budgets per session and per client IP, and a much smaller
+# budget for turns that call OpenAI than for scripted (qualification/booking) turns
+def _rate_limit_budget(name: str, burst: float, per_minute: float):
+    prefix = f"RATE_LIMIT_{name.upper()}"
+    return (
+        float(os.getenv(f"{prefix}_BURST", burst)),
+        float(os.getenv(f"{prefix}_PER_MINUTE", per_minute)) / 60
+    )
+
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() != 'false'
+RATE_LIMIT_BUDGETS = {
+    'llm_session': _rate_limit_budget('llm_session', 5, 10),
+    'llm_ip': _rate_limit_budget('llm_ip', 15, 30),
+    'scripted_session': _rate_limit_budget('scripted_session', 20, 60),
+    'scripted_ip': _rate_limit_budget('scripted_ip', 60, 240)
+}
+
+# Use RATE_LIMIT_BACKEND=sqlite to share counters across gunicorn workers
+if os.getenv('RATE_LIMIT_BACKEND', 'memory') == 'sqlite':
+    rate_limiter = SQLiteTokenBucketLimiter(RATE_LIMIT_BUDGETS, os.getenv('RATE_LIMIT_DB', 'ratelimit.db'))
+else:
+    rate_limiter = TokenBucketLimiter(RATE_LIMIT_BUDGETS)
+
+def get_client_ip() -> str:
+    """Client IP as seen by the trusted proxy (ProxyFix sets remote_addr from X-Forwarded-For)"""
+    return request.remote_addr or 'unknown'
+
+def check_rate_limit(tier: str, session_id: Optional[str]) -> float:
+    """
+    Take a token from the session and IP buckets for a tier ('llm' or 'scripted'); returns retry-after seconds.
+    Requests without a client session_id only use the IP bucket, since a shared fallback id would be one site-wide budget.
+    """
+    if not RATE_LIMIT_ENABLED:
+        return 0.0
+    buckets = [(f"{tier}_ip", get_client_ip())]
+    if session_id:
+        buckets.append((f"{tier}_session", session_id))
+    return rate_limiter.acquire(buckets)
+
+def rate_limited_response(retry_after: float):
+    response = jsonify({
+        'error': "You're sending messages too quickly. Please wait a moment and try again."
+    })
+    response.status_code = 429
+    response.headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+    return response
+
 # Lead Qualification System
 LEAD_QUALIFICATION_QUESTIONS = [
     {
@@ -75,8 +154,26 @@ LEAD_QUALIFICATION_QUESTIONS = [
             "Excellent (740+)",
             "Good (670-739)",
             "Fair (580-669)",
+            "Poor below 580",
             "Not sure"
-        ]
+        ],
+        # Scores are bucketed by range; words are matched in order when there's no number
+        "parser": "credit_score",
+        "buckets": [
+            (0, "Poor below 580"),
+            (580, "Fair (580-669)"),
+            (670, "Good (670-739)"),
+            (740, "Excellent (740+)")
+        ],
+        "keywords": [
+            ("excellent", "Excellent (740+)"),
+            ("good", "Good (670-739)"),
+            ("fair", "Fair (580-669)"),
+            ("poor", "Poor below 580"),
+            ("not sure", "Not sure"),
+            ("unsure", "Not sure")
+        ],
+        "reprompt": "Question {number} of {total}. {question} {options}."
     },
     {
         "id": 5,
@@ -125,78 +222,77 @@ LEAD_SCORING_CRITERIA = {
     }
 }
 
-# Initialize database
-def init_database():
-    """Initialize SQLite database for storing leads"""
-    conn = sqlite3.connect('leads.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS leads (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            session_id TEXT NOT NULL,
-            annual_income REAL,
-            down_payment REAL,
-            monthly_debt REAL,
-            credit_score TEXT,
-            property_costs REAL,
-            timeline TEXT,
-            lead_score TEXT,
-            contact_info TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-# Initialize database on startup
-init_database()
-
-def init_rates_table():
-    """Initialize rates table and set default rates if not present."""
-    conn = sqlite3.connect('leads.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS rates (
-            id INTEGER PRIMARY KEY CHECK (id = 1),
-            fixed_rate REAL,
-            variable_rate REAL,
-            three_year_fixed_rate REAL,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    # Check if a row exists; if not, insert defaults
-    cursor.execute('SELECT COUNT(*) FROM rates WHERE id = 1')
-    if cursor.fetchone()[0] == 0:
-        cursor.execute('''
-            INSERT INTO rates (id, fixed_rate, variable_rate, three_year_fixed_rate) VALUES (1, 5.5, 5.8, 5.2)
-        ''')
-    conn.commit()
-    conn.close()
-
-def migrate_rates_table():
-    conn = sqlite3.connect('leads.db')
-    cursor = conn.cursor()
-    # Try to add the column if it doesn't exist
-    try:
-        cursor.execute("ALTER TABLE rates ADD COLUMN three_year_fixed_rate REAL DEFAULT 5.2")
-        conn.commit()
-    except sqlite3.OperationalError:
-        # Column already exists
-        pass
-    conn.close()
+# Question parsers, prompts and states compiled once; see qualification.py
+qualification_flow = QualificationFlow(LEAD_QUALIFICATION_QUESTIONS)
 
-# Call this function at startup
-migrate_rates_table()
+# Scripted intents, each compiled into a single regex
+BOOKING_PATTERN = re.compile('|'.join([
+    r'book', r'schedule', r'appointment', r'meeting', r'get an appointment',
+    r'see a broker', r'meet', r'consult', r'call', r'talk to', r'speak to', r'visit'
+]))
+QUALIFICATION_PATTERN = re.compile('|'.join([
+    r'qualif(y|ication|ied)',
+    r'how much.*(qualify|afford|get|borrow)',
+    r'what.*(qualify for|max(imum)? mortgage|can i afford|can i get|can i borrow)',
+    r'can i afford',
+    r'pre-approval',
+    r'preapproval',
+    r'pre-qual',
+    r'prequal',
+    r'estimate',
+    r'budget',
+    r'purchase power',
+    r'mortgage amount',
+    r'afford.*house',
+    r'afford.*home',
+    r'how much.*house',
+    r'how much.*home',
+    r'eligible',
+    r'eligibility',
+    r'approval'
+]))
+BOOKING_RESPONSE = {
+    "role": "assistant",
+    "content": (
+        "You can book a time directly here:<br>"
+        "<a href='https://calendly.com/steve-r-ennis' target='_blank'>Book a Consultation</a>"
+    )
+}
 
-# Lead Qualification Helper Functions
-def extract_number_from_text(text: str) -> Optional[float]:
-    """Extract numeric value from text input"""
-    import re
-    numbers = re.findall(r'\d+(?:,\d+)*(?:\.\d+)?', text.replace(',', ''))
-    if numbers:
-        return float(numbers[0])
-    return None
+# Closing message per lead score, with educational resources for cold leads
+LEAD_SCORE_RESPONSES = {score: criteria["message"] for score, criteria in LEAD_SCORING_CRITERIA.items()}
+LEAD_SCORE_RESPONSES["cold"] += """
+                        
+                        Here are some helpful resources:
+                        • <a href='https://www.cmhc-schl.gc.ca/en/consumers/home-buying' target='_blank'>CMHC Home Buying Guide</a>
+                        • <a href='https://www.transunion.ca/credit-score' target='_blank'>Understanding Your Credit Score</a>
+                        • <a href='https://www.canada.ca/en/financial-consumer-agency/services/mortgages.html' target='_blank'>Government of Canada Mortgage Information</a>
+                        
+                        Would you like me to send you a guide on improving your credit score or saving for a down payment?"""
+
+# Storage backend for leads, rates and stats (STORAGE_BACKEND=memory keeps everything in process)
+if os.getenv('STORAGE_BACKEND', 'sqlite') == 'memory':
+    lead_store = InMemoryLeadStore()
+else:
+    lead_store = SQLiteLeadStore(os.getenv('LEADS_DB', 'leads.db'))
 
+# Create tables and default rates on startup
+lead_store.initialize()
+
+# Structured chat event log (JSON lines, written in the background). Sampling is per
+# session; EVENT_LOG_REDACT lists fields replaced with "[redacted]" wherever they appear,
+# and emails / phone numbers are always scrubbed from logged text. Use {pid} in
+# EVENT_LOG_PATH to give each gunicorn worker its own file.
+EVENT_LOG_ENABLED = os.getenv('EVENT_LOG_ENABLED', 'true').lower() != 'false'
+event_log = EventLogger(
+    os.getenv('EVENT_LOG_PATH', 'logs/events.jsonl').format(pid=os.getpid()),
+    max_bytes=int(os.getenv('EVENT_LOG_MAX_BYTES', 10 * 1024 * 1024)),
+    backups=int(os.getenv('EVENT_LOG_BACKUPS', 5)),
+    sample_rate=float(os.getenv('EVENT_LOG_SAMPLE_RATE', 1.0)),
+    redact_fields=[field.strip() for field in os.getenv('EVENT_LOG_REDACT', 'contact_info').split(',') if field.strip()]
+) if EVENT_LOG_ENABLED else None
+
+# Lead Qualification Helper Functions
 def get_credit_score_numeric(credit_score_text: str) -> Optional[int]:
     """Convert credit score text to numeric value"""
     if "740+" in credit_score_text:
@@ -232,58 +328,33 @@ def score_lead(lead_data: Dict[str, Any]) -> str:
     # Default to cold lead
     return "cold"
 
-def save_lead_to_database(session_id: str, lead_data: Dict[str, Any], lead_score: str):
-    """Save lead data to SQLite database"""
+def save_lead_to_database(session_id: str, lead_data: Dict[str, Any], lead_score: str, attempt: int = 0):
+    """Save lead data to the lead store (updating the session's lead if it was already saved)"""
     try:
-        conn = sqlite3.connect('leads.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO leads (
-                session_id, annual_income, down_payment, monthly_debt, 
-                credit_score, property_costs, timeline, lead_score
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            session_id,
-            lead_data.get('annual_income'),
-            lead_data.get('down_payment'),
-            lead_data.get('monthly_debt'),
-            lead_data.get('credit_score'),
-            lead_data.get('property_costs'),
-            lead_data.get('timeline'),
-            lead_score
-        ))
-        conn.commit()
-        conn.close()
+        lead_store.save_lead(dict(lead_data, session_id=session_id, lead_score=lead_score, attempt=attempt))
         logger.info(f"Lead saved to database for session {session_id}")
     except Exception as e:
         logger.error(f"Error saving lead to database: {str(e)}")
 
 def get_current_fixed_rate() -> float:
+    return get_current_rates()['fixed_rate']
+
+def get_current_rates() -> Dict[str, float]:
+    """Current fixed, variable and 3-year fixed rates, falling back to defaults"""
+    rates = dict(DEFAULT_RATES)
     try:
-        conn = sqlite3.connect('leads.db')
-        cursor = conn.cursor()
-        cursor.execute('SELECT fixed_rate FROM rates WHERE id = 1')
-        row = cursor.fetchone()
-        conn.close()
-        if row and row[0]:
-            return float(row[0])
+        stored = lead_store.get_rates() or {}
+        for name in rates:
+            if stored.get(name):
+                rates[name] = float(stored[name])
     except Exception as e:
-        logger.error(f"Error fetching fixed rate: {str(e)}")
-    return 5.5  # fallback default
+        logger.error(f"Error fetching rates: {str(e)}")
+    return rates
 
-def calculate_mortgage_estimate(lead_data: Dict[str, Any]) -> str:
-    """Calculate rough mortgage estimate based on lead data and current fixed rate"""
-    annual_income = lead_data.get('annual_income', 0)
-    down_payment = lead_data.get('down_payment', 0)
-    monthly_debt = lead_data.get('monthly_debt', 0)
-    property_costs = lead_data.get('property_costs', 0)
-    
-    if not annual_income:
-        return "I'd need your income information to provide an accurate estimate."
-    
-    # Get the current fixed rate
-    fixed_rate = get_current_fixed_rate()
-    rate_display = f"{fixed_rate:.2f}%"
+def calculate_mortgage_figures(lead_data: Dict[str, Any], fixed_rate: float):
+    """Return (max_mortgage, max_property_value, monthly_payment) for a lead at the given fixed rate"""
+    annual_income = lead_data.get('annual_income') or 0
+    down_payment = lead_data.get('down_payment') or 0
     interest = fixed_rate / 100
     
     # Rough calculation: 4-5x annual income, minus down payment
@@ -297,6 +368,19 @@ def calculate_mortgage_estimate(lead_data: Dict[str, Any]) -> str:
         monthly_payment = (max_mortgage * monthly_interest) / (1 - (1 + monthly_interest) ** -n_payments)
     except Exception:
         monthly_payment = 0
+    return max_mortgage, max_property_value, monthly_payment
+
+def calculate_mortgage_estimate(lead_data: Dict[str, Any]) -> str:
+    """Calculate rough mortgage estimate based on lead data and current fixed rate"""
+    annual_income = lead_data.get('annual_income', 0)
+    
+    if not annual_income:
+        return "I'd need your income information to provide an accurate estimate."
+    
+    # Get the current fixed rate
+    fixed_rate = get_current_fixed_rate()
+    rate_display = f"{fixed_rate:.2f}%"
+    max_mortgage, max_property_value, monthly_payment = calculate_mortgage_figures(lead_data, fixed_rate)
     
     return (
         f"Based on your information and a current 5-year fixed rate of {rate_display}, you might qualify for a mortgage of approximately ${max_mortgage:,.0f}, "
@@ -326,12 +410,213 @@ Guidelines:
 
 Remember: You represent a professional mortgage brokerage. Be helpful but always recommend speaking with our licensed mortgage professionals for personalized advice."""
 
+# Local FAQ tier - high-confidence matches against broker-approved answers skip OpenAI
+FAQ_ENABLED = os.getenv('FAQ_ENABLED', 'true').lower() != 'false'
+FAQ_MIN_CONFIDENCE = float(os.getenv('FAQ_MIN_CONFIDENCE', 0.45))
+# Assumed OpenAI latency until this worker has timed real calls
+FAQ_LLM_LATENCY_ESTIMATE = float(os.getenv('FAQ_LLM_LATENCY_ESTIMATE', 2.0))
+
+try:
+    faq_index = FAQIndex.from_file(os.getenv('FAQ_PATH', 'faq.json'))
+except (OSError, ValueError) as e:
+    logger.error(f"FAQ index not loaded: {str(e)}")
+    faq_index = None
+
+# Per-worker counters for /api/faq/stats
+faq_stats = {
+    'hits': 0,
+    'misses': 0,
+    'lookup_seconds': 0.0,
+    'llm_calls': 0,
+    'llm_seconds': 0.0
+}
+
+def answer_from_faq(user_message: str) -> Optional[Dict[str, Any]]:
+    """Return the matching FAQ entry and answer text, or None to fall through to OpenAI"""
+    if not FAQ_ENABLED or faq_index is None:
+        return None
+    start = time.perf_counter()
+    entry, confidence = faq_index.search(user_message)
+    result = None
+    if entry is not None and confidence >= FAQ_MIN_CONFIDENCE:
+        answer = entry['answer']
+        if '{' in answer:
+            answer = answer.format(**get_current_rates())
+        result = {'id': entry['id'], 'answer': answer, 'confidence': confidence}
+    faq_stats['lookup_seconds'] += time.perf_counter() - start
+    faq_stats['hits' if result else 'misses'] += 1
+    return result
+
+# Request profiling - requests with a valid X-Profile-Signature header (see profiling.py)
+# or picked by PROFILE_SAMPLE_RATE run under cProfile. The hooks are only registered
+# when one of these is configured, so there is no per-request cost when profiling is off.
+PROFILE_SECRET = os.getenv('PROFILE_SECRET')
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+PROFILING_ENABLED = bool(PROFILE_SECRET) or PROFILE_SAMPLE_RATE > 0
+
+profile_store = ProfileStore(
+    os.getenv('PROFILE_DIR', 'profiles'),
+    max(1, int(os.getenv('PROFILE_MAX_ENTRIES', 100)))
+) if PROFILING_ENABLED else None
+
+def start_request_profile():
+    if request.path.startswith('/api/profiles'):
+        return
+    signature = request.headers.get('X-Profile-Signature')
+    if signature and PROFILE_SECRET and verify_profile_signature(PROFILE_SECRET, signature):
+        g.profile_reason = 'signed'
+    elif PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+        g.profile_reason = 'sampled'
+    else:
+        return
+    g.profile_started = time.perf_counter()
+    g.profiler = cProfile.Profile()
+    g.profiler.enable()
+
+def save_request_profile(profiler, metadata: Dict[str, Any], started: float, response_bytes, profile_id=None):
+    profiler.disable()
+    metadata = dict(
+        metadata,
+        duration_ms=round((time.perf_counter() - started) * 1000, 3),
+        response_bytes=response_bytes
+    )
+    try:
+        return profile_store.save(profiler, metadata, profile_id)
+    except Exception as e:
+        logger.error(f"Error saving request profile: {str(e)}")
+        return None
+
+def finish_request_profile(response):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+    started = g.profile_started
+    metadata = {
+        # Never the raw path: it's client-controlled and shown on the admin page
+        'route': request.url_rule.rule if request.url_rule else '<unmatched>',
+        'method': request.method,
+        'status': response.status_code,
+        'reason': g.profile_reason,
+        'started_at': datetime.now().isoformat(),
+        'request_bytes': request.content_length
+    }
+    if not response.is_streamed:
+        profile_id = save_request_profile(profiler, metadata, started, response.calculate_content_length())
+        if profile_id:
+            response.headers['X-Profile-Id'] = profile_id
+        return response
+
+    # Streamed bodies (bulk import, export, amortization) do their work after this hook,
+    # so keep profiling until the server closes the response
+    profile_id = profile_store.new_id()
+    response.headers['X-Profile-Id'] = profile_id
+    body = response.response
+    sent = [0]
+
+    def counted_body():
+        try:
+            for chunk in body:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                sent[0] += len(chunk)
+                yield chunk
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+
+    response.response = counted_body()
+    response.call_on_close(lambda: save_request_profile(profiler, metadata, started, sent[0], profile_id))
+    return response
+
+if PROFILING_ENABLED:
+    app.before_request(start_request_profile)
+    app.after_request(finish_request_profile)
+
 @app.route('/')
 def serve_index():
     return send_from_directory('.', 'index.html')
 
+def scripted_response(
+    user_message: str,
+    session_id: str,
+    qualification_state: Dict[str, Any],
+    lead_data: Dict[str, Any],
+    attempt: int = 0
+) -> Optional[Dict[str, Any]]:
+    """Reply for booking and qualification turns, or None when the message is for the FAQ / OpenAI"""
+    message = user_message.lower()
+    if BOOKING_PATTERN.search(message):
+        return dict(BOOKING_RESPONSE)
+
+    # Qualification request before the flow has started
+    if not qualification_state.get('in_progress') and QUALIFICATION_PATTERN.search(message):
+        return qualification_flow.start()
+
+    # Special trigger for quick action button
+    if message.strip() == 'start qualification':
+        return qualification_flow.start(lead_data)
+
+    turn = qualification_flow.handle(user_message, qualification_state, lead_data)
+    if turn is None:
+        return None
+    if not turn.completed:
+        return turn.response
+
+    # All questions answered - calculate estimate, score and save the lead
+    mortgage_estimate = calculate_mortgage_estimate(lead_data)
+    lead_score = score_lead(lead_data)
+    save_lead_to_database(session_id, lead_data, lead_score, attempt)
+    return {
+        "role": "assistant",
+        "content": f"{mortgage_estimate}\n\n{LEAD_SCORE_RESPONSES[lead_score]}",
+        "qualification_state": dict(qualification_flow.completed_state),
+        "lead_data": lead_data,
+        "lead_score": lead_score
+    }
+
+# Responses remembered per Idempotency-Key header so retried chat turns aren't handled twice
+idempotency_cache = IdempotencyCache(
+    ttl=float(os.getenv('IDEMPOTENCY_TTL', 600)),
+    max_keys=int(os.getenv('IDEMPOTENCY_MAX_KEYS', 10000))
+)
+
 @app.route('/chatbot-api', methods=['POST'])
 def chatbot_api():
+    """
+    Handle a chat turn, replaying the stored response when the Idempotency-Key header repeats
+    """
+    idempotency_key = request.headers.get('Idempotency-Key', '').strip()
+    if not idempotency_key:
+        return chat_turn()
+    if len(idempotency_key) > 255:
+        return jsonify({'error': 'Idempotency-Key too long'}), 400
+
+    # Keys come from the client, so scope them to the session. Requests without a session_id
+    # have no private scope (anonymous clients would replay each other's lead data), so they
+    # aren't cached
+    data = request.get_json(silent=True)
+    session_id = str(data.get('session_id') or '').strip() if isinstance(data, dict) else ''
+    if not session_id:
+        return chat_turn()
+    cache_key = (session_id, idempotency_key)
+    stored = idempotency_cache.begin(cache_key)
+    if stored is IN_PROGRESS:
+        return jsonify({'error': 'A request with this Idempotency-Key is still being processed'}), 409
+    if stored is not None:
+        body, status, mimetype = stored
+        response = Response(body, status=status, mimetype=mimetype)
+        response.headers['Idempotent-Replayed'] = 'true'
+        return response
+
+    response = app.make_response(chat_turn())
+    if response.status_code == 200:
+        idempotency_cache.complete(cache_key, (response.get_data(), response.status_code, response.mimetype))
+    else:
+        # Errors and rate limiting aren't final; let the retry run again
+        idempotency_cache.discard(cache_key)
+    return response
+
+def chat_turn():
     """
     Handle chatbot API requests with lead qualification system
     """
@@ -351,238 +636,56 @@ def chatbot_api():
             return jsonify({'error': 'Invalid input'}), 400
 
         user_message = data['message'].strip()
-        session_id = data.get('session_id', 'default_session')
+        # Clients without a session_id (the site widget) share one id; their leads are never merged
+        client_session_id = str(data.get('session_id') or '').strip() or None
+        session_id = client_session_id or ANONYMOUS_SESSION_ID
         conversation_history = data.get('history', [])
         qualification_state = data.get('qualification_state', {})
         lead_data = data.get('lead_data', {})
+        # Optional: clients that want a separate lead per qualification run send 1, 2, ...
+        attempt = data.get('attempt', 0)
 
         # Validate message length
         if len(user_message) > 500:
             return jsonify({'error': 'Message too long'}), 400
 
-        print(f"User message: {user_message}")
-        print(f"Qualification state: {qualification_state}")
-        print(f"Lead data: {lead_data}")
+        if not isinstance(attempt, int) or isinstance(attempt, bool) or attempt < 0:
+            return jsonify({'error': 'Invalid attempt'}), 400
 
-        # Check for booking intent first
-        booking_patterns = [
-            r'book', r'schedule', r'appointment', r'meeting', r'get an appointment',
-            r'see a broker', r'meet', r'consult', r'call', r'talk to', r'speak to', r'visit'
-        ]
-        for pattern in booking_patterns:
-            if re.search(pattern, user_message.lower()):
-                return jsonify({
-                    "role": "assistant",
-                    "content": (
-                        "You can book a time directly here:<br>"
-                        "<a href='https://calendly.com/steve-r-ennis' target='_blank'>Book a Consultation</a>"
-                    )
-                })
+        retry_after = check_rate_limit('scripted', client_session_id)
+        if retry_after:
+            return rate_limited_response(retry_after)
 
-        # Check for qualification intent (improved regex-based matching)
-        qualification_patterns = [
-            r'qualif(y|ication|ied)',
-            r'how much.*(qualify|afford|get|borrow)',
-            r'what.*(qualify for|max(imum)? mortgage|can i afford|can i get|can i borrow)',
-            r'can i afford',
-            r'pre-approval',
-            r'preapproval',
-            r'pre-qual',
-            r'prequal',
-            r'estimate',
-            r'budget',
-            r'purchase power',
-            r'mortgage amount',
-            r'afford.*house',
-            r'afford.*home',
-            r'how much.*house',
-            r'how much.*home',
-            r'eligible',
-            r'eligibility',
-            r'approval'
-        ]
-        is_qualification_request = any(re.search(pattern, user_message.lower()) for pattern in qualification_patterns)
-        
-        # If this is a qualification request and we haven't started the flow yet
-        if is_qualification_request and not qualification_state.get('in_progress'):
-            return jsonify({
-                "role": "assistant",
-                "content": f"Great! Let's get started. {LEAD_QUALIFICATION_QUESTIONS[0]['question']}",
-                "qualification_state": {
-                    "in_progress": True,
-                    "current_question": 1,
-                    "waiting_for_response": False
-                }
-            })
+        if event_log:
+            event_log.log(
+                'chat_request',
+                # Without a client session_id every widget request shares one id, so sample per request
+                sample_key=client_session_id or uuid.uuid4().hex,
+                session_id=session_id,
+                message=user_message,
+                qualification_state=qualification_state,
+                lead_data=lead_data
+            )
+
+        # Booking and qualification turns are answered without OpenAI
+        response = scripted_response(user_message, session_id, qualification_state, lead_data, attempt)
+        if response is not None:
+            return jsonify(response)
 
-        # Special trigger for quick action button
-        if user_message.strip().lower() == 'start qualification':
+        # Answer common questions from the local FAQ before calling OpenAI
+        faq_answer = answer_from_faq(user_message)
+        if faq_answer:
             return jsonify({
-                "role": "assistant",
-                "content": "Great! Let's get started. " + LEAD_QUALIFICATION_QUESTIONS[0]['question'],
-                "qualification_state": {
-                    "in_progress": True,
-                    "current_question": 1,
-                    "waiting_for_response": False
-                },
-                "lead_data": lead_data
+                'role': 'assistant',
+                'content': faq_answer['answer'],
+                'source': 'faq'
             })
 
-        # Handle qualification flow
-        if qualification_state.get('in_progress'):
-            current_question = qualification_state.get('current_question', 0)
-            
-            # If we're waiting for a response to the qualification prompt
-            if qualification_state.get('waiting_for_response'):
-                if any(word in user_message.lower() for word in ['yes', 'yeah', 'sure', 'okay', 'ok', 'yep']):
-                    # Start the qualification questions
-                    return jsonify({
-                        "role": "assistant",
-                        "content": f"Great! Let's get started. {LEAD_QUALIFICATION_QUESTIONS[0]['question']}",
-                        "qualification_state": {
-                            "in_progress": True,
-                            "current_question": 1,
-                            "waiting_for_response": False
-                        }
-                    })
-                else:
-                    # User doesn't want to qualify, return to normal chat
-                    return jsonify({
-                        "role": "assistant",
-                        "content": "No problem! How else can I help you with your mortgage questions today?",
-                        "qualification_state": {
-                            "in_progress": False,
-                            "current_question": 0,
-                            "waiting_for_response": False
-                        }
-                    })
-            
-            # Handle qualification question responses
-            if current_question > 0 and current_question <= len(LEAD_QUALIFICATION_QUESTIONS):
-                question_data = LEAD_QUALIFICATION_QUESTIONS[current_question - 1]
-                field_name = question_data['field']
-                
-                # Process the answer
-                if question_data['type'] == 'number':
-                    # Extract number from text
-                    numeric_value = extract_number_from_text(user_message)
-                    if numeric_value is not None:
-                        lead_data[field_name] = numeric_value
-                    else:
-                        return jsonify({
-                            "role": "assistant",
-                            "content": "I need a number for that. Could you please provide a numeric value?",
-                            "qualification_state": qualification_state,
-                            "lead_data": lead_data
-                        })
-                elif question_data['type'] == 'select':
-                    # Special handling for credit score question (Question 4)
-                    if current_question == 4:
-                        user_input = user_message.strip().lower()
-                        selected_option = None
-                        # Try to extract a number
-                        numeric_value = extract_number_from_text(user_message)
-                        if numeric_value is not None:
-                            if numeric_value >= 740:
-                                selected_option = "Excellent (740+)"
-                            elif 670 <= numeric_value < 740:
-                                selected_option = "Good (670-739)"
-                            elif 580 <= numeric_value < 670:
-                                selected_option = "Fair (580-669)"
-                            elif numeric_value < 580:
-                                selected_option = "Poor below 580"
-                        else:
-                            # Try to match a word
-                            if "excellent" in user_input:
-                                selected_option = "Excellent (740+)"
-                            elif "good" in user_input:
-                                selected_option = "Good (670-739)"
-                            elif "fair" in user_input:
-                                selected_option = "Fair (580-669)"
-                            elif "poor" in user_input:
-                                selected_option = "Poor below 580"
-                            elif "not sure" in user_input or "unsure" in user_input:
-                                selected_option = "Not sure"
-                        if selected_option:
-                            lead_data[field_name] = selected_option
-                        else:
-                            # Inline options for credit score
-                            options_inline = "Excellent (740+); Good (670-739); Fair (580-669); Poor below 580; Not sure."
-                            return jsonify({
-                                "role": "assistant",
-                                "content": f"Question 4 of 6. What is your credit score approximately? {options_inline}",
-                                "qualification_state": qualification_state,
-                                "lead_data": lead_data
-                            })
-                    else:
-                        # Check if user selected one of the options
-                        selected_option = None
-                        for option in question_data['options']:
-                            if option.lower() in user_message.lower() or any(word in user_message.lower() for word in option.lower().split()):
-                                selected_option = option
-                                break
-                        if selected_option:
-                            lead_data[field_name] = selected_option
-                        else:
-                            # Show options again (for other select questions)
-                            options_text = "\n".join([f"- {option}" for option in question_data['options']])
-                            return jsonify({
-                                "role": "assistant",
-                                "content": f"Please select one of these options:\n{options_text}",
-                                "qualification_state": qualification_state,
-                                "lead_data": lead_data
-                            })
-                
-                # Move to next question or finish
-                if current_question < len(LEAD_QUALIFICATION_QUESTIONS):
-                    next_question = LEAD_QUALIFICATION_QUESTIONS[current_question]
-                    return jsonify({
-                        "role": "assistant",
-                        "content": f"Question {current_question + 1} of {len(LEAD_QUALIFICATION_QUESTIONS)}. {next_question['question']}",
-                        "qualification_state": {
-                            "in_progress": True,
-                            "current_question": current_question + 1,
-                            "waiting_for_response": False
-                        },
-                        "lead_data": lead_data
-                    })
-                else:
-                    # All questions answered - calculate estimate and score lead
-                    mortgage_estimate = calculate_mortgage_estimate(lead_data)
-                    lead_score = score_lead(lead_data)
-                    
-                    # Save lead to database
-                    save_lead_to_database(session_id, lead_data, lead_score)
-                    
-                    # Get appropriate response based on lead score
-                    score_response = LEAD_SCORING_CRITERIA[lead_score]["message"]
-                    
-                    # Add educational content for cold leads
-                    if lead_score == "cold":
-                        educational_content = """
-                        
-                        Here are some helpful resources:
-                        • <a href='https://www.cmhc-schl.gc.ca/en/consumers/home-buying' target='_blank'>CMHC Home Buying Guide</a>
-                        • <a href='https://www.transunion.ca/credit-score' target='_blank'>Understanding Your Credit Score</a>
-                        • <a href='https://www.canada.ca/en/financial-consumer-agency/services/mortgages.html' target='_blank'>Government of Canada Mortgage Information</a>
-                        
-                        Would you like me to send you a guide on improving your credit score or saving for a down payment?"""
-                        score_response += educational_content
-                    
-                    return jsonify({
-                        "role": "assistant",
-                        "content": f"{mortgage_estimate}\n\n{score_response}",
-                        "qualification_state": {
-                            "in_progress": False,
-                            "current_question": 0,
-                            "waiting_for_response": False,
-                            "completed": True
-                        },
-                        "lead_data": lead_data,
-                        "lead_score": lead_score
-                    })
-
         # Default: Use OpenAI for general conversation
+        retry_after = check_rate_limit('llm', client_session_id)
+        if retry_after:
+            return rate_limited_response(retry_after)
+
         messages = [
             {'role': 'system', 'content': SYSTEM_PROMPT}
         ]
@@ -602,13 +705,16 @@ def chatbot_api():
 
         # Make request to OpenAI
         try:
+            llm_start = time.perf_counter()
             response = openai.ChatCompletion.create(
                 model='gpt-3.5-turbo',
                 messages=messages,
                 max_tokens=300,
                 temperature=0.7,
-                timeout=30
+                request_timeout=http_client.timeout(OPENAI_READ_TIMEOUT)
             )
+            faq_stats['llm_calls'] += 1
+            faq_stats['llm_seconds'] += time.perf_counter() - llm_start
 
             # Extract AI response
             if not response.choices or not response.choices[0].message:
@@ -649,6 +755,97 @@ def health_check():
         'api_configured': bool(OPENAI_API_KEY)
     })
 
+# Rows per chunk when streaming amortization schedules
+AMORTIZATION_CHUNK_SIZE = 500
+
+def parse_schedule_events(items, value_name: str, total_periods: int, max_value: float = math.inf):
+    """Parse [{period, <value_name>}] into a sorted, hashable tuple of (period, value) pairs"""
+    events = []
+    for item in items or []:
+        period = int(item['period'])
+        value = float(item[value_name])
+        if not 1 <= period <= total_periods or not math.isfinite(value) or not 0 <= value <= max_value:
+            raise ValueError(f"Invalid {value_name} at period {period}")
+        events.append((period, value))
+    return tuple(sorted(events))
+
+@app.route('/api/amortization', methods=['GET', 'POST'])
+def amortization():
+    """
+    Full amortization schedule for a mortgage, streamed as chunked JSON (default) or CSV (format=csv).
+    Accepts principal, rate (defaults to the current fixed rate), amortization_years, frequency,
+    and - in a JSON body - prepayments [{period, amount}] and renewals [{period, rate}].
+    """
+    body = request.get_json(silent=True)
+    if body is not None and not isinstance(body, dict):
+        return jsonify({'error': 'Invalid amortization parameters: JSON body must be an object'}), 400
+    data = body or request.args
+    try:
+        principal = round(float(data.get('principal')), 2)
+        annual_rate = float(data['rate']) if data.get('rate') not in (None, '') else get_current_fixed_rate()
+        amortization_years = float(data.get('amortization_years', 25))
+        frequency = data.get('frequency', 'monthly')
+        if frequency not in PERIODS_PER_YEAR:
+            raise ValueError(f"frequency must be one of: {', '.join(PERIODS_PER_YEAR)}")
+        if not all(math.isfinite(value) for value in (principal, annual_rate, amortization_years)):
+            raise ValueError("principal, rate and amortization_years must be finite numbers")
+        if (not 0 < principal <= MAX_PRINCIPAL or not 0 < amortization_years <= MAX_AMORTIZATION_YEARS
+                or not 0 <= annual_rate <= MAX_ANNUAL_RATE):
+            raise ValueError(
+                f"principal (up to {MAX_PRINCIPAL:,.0f}), rate (0-{MAX_ANNUAL_RATE:g}%) "
+                f"or amortization_years (up to {MAX_AMORTIZATION_YEARS}) out of range"
+            )
+        total_periods = int(round(amortization_years * PERIODS_PER_YEAR[frequency]))
+        if total_periods < 1:
+            raise ValueError("amortization_years is shorter than one payment period")
+        prepayments = parse_schedule_events(data.get('prepayments'), 'amount', total_periods)
+        renewals = parse_schedule_events(data.get('renewals'), 'rate', total_periods, MAX_ANNUAL_RATE)
+    except (TypeError, ValueError, KeyError, OverflowError) as e:
+        return jsonify({'error': f"Invalid amortization parameters: {str(e)}"}), 400
+
+    output_format = request.args.get('format') or data.get('format') or 'json'
+    try:
+        # Memoized on the full set of inputs
+        result = amortization_schedule(principal, annual_rate, amortization_years, frequency, prepayments, renewals)
+    except Exception as e:
+        logger.error(f"Error computing amortization schedule: {str(e)}")
+        return jsonify({'error': 'Failed to compute amortization schedule'}), 500
+
+    schedule = result['schedule']
+    value_columns = SCHEDULE_COLUMNS[1:]
+
+    def chunks():
+        for start in range(0, result['summary']['periods'], AMORTIZATION_CHUNK_SIZE):
+            end = start + AMORTIZATION_CHUNK_SIZE
+            periods = schedule['period'][start:end].tolist()
+            values = np.column_stack([schedule[column][start:end] for column in value_columns]).round(2).tolist()
+            yield start, zip(periods, values)
+
+    def generate_csv():
+        yield ','.join(SCHEDULE_COLUMNS) + '\n'
+        for _, rows in chunks():
+            yield ''.join(
+                f"{period}," + ','.join(f"{value:.2f}" for value in row) + '\n'
+                for period, row in rows
+            )
+
+    def generate_json():
+        yield '{"summary": ' + json.dumps(result['summary']) + ', "schedule": ['
+        for start, rows in chunks():
+            yield (',' if start else '') + ','.join(
+                json.dumps({'period': period, **dict(zip(value_columns, row))})
+                for period, row in rows
+            )
+        yield ']}'
+
+    if output_format == 'csv':
+        return Response(
+            generate_csv(),
+            mimetype='text/csv',
+            headers={'Content-Disposition': 'attachment; filename=amortization_schedule.csv'}
+        )
+    return Response(generate_json(), mimetype='application/json')
+
 @app.route('/api/calendly-events', methods=['GET'])
 def calendly_events():
     """
@@ -668,7 +865,7 @@ def calendly_events():
             'Authorization': f'Bearer {calendly_api_key}',
             'Content-Type': 'application/json'
         }
-        response = requests.get(url, headers=headers, timeout=10)
+        response = http_client.get(url, CALENDLY_READ_TIMEOUT, headers=headers)
         response.raise_for_status()
         data = response.json()
         # Return only relevant fields to frontend
@@ -688,118 +885,252 @@ def calendly_events():
 
 @app.route('/api/leads', methods=['GET'])
 def get_leads():
-    """Get all leads from database (for admin purposes)"""
+    """Get leads from database, newest first (for admin purposes); ?limit= caps the count"""
     try:
-        conn = sqlite3.connect('leads.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, session_id, annual_income, down_payment, monthly_debt, 
-                   credit_score, property_costs, timeline, lead_score, 
-                   contact_info, created_at 
-            FROM leads 
-            ORDER BY created_at DESC
-        ''')
-        leads = []
-        for row in cursor.fetchall():
-            leads.append({
-                'id': row[0],
-                'session_id': row[1],
-                'annual_income': row[2],
-                'down_payment': row[3],
-                'monthly_debt': row[4],
-                'credit_score': row[5],
-                'property_costs': row[6],
-                'timeline': row[7],
-                'lead_score': row[8],
-                'contact_info': row[9],
-                'created_at': row[10]
-            })
-        conn.close()
-        return jsonify({'leads': leads})
+        limit = request.args.get('limit', type=int)
+        return jsonify({'leads': lead_store.list_leads(limit)})
     except Exception as e:
         logger.error(f"Error fetching leads: {str(e)}")
         return jsonify({'error': 'Failed to fetch leads'}), 500
 
 @app.route('/api/leads/export', methods=['GET'])
 def export_leads():
-    """Export leads to CSV format"""
-    try:
-        conn = sqlite3.connect('leads.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT session_id, annual_income, down_payment, monthly_debt, 
-                   credit_score, property_costs, timeline, lead_score, 
-                   contact_info, created_at 
-            FROM leads 
-            ORDER BY created_at DESC
-        ''')
-        
-        # Create CSV content
-        csv_content = "Session ID,Annual Income,Down Payment,Monthly Debt,Credit Score,Property Costs,Timeline,Lead Score,Contact Info,Created At\n"
-        for row in cursor.fetchall():
-            csv_content += f"{row[0]},{row[1] or ''},{row[2] or ''},{row[3] or ''},{row[4] or ''},{row[5] or ''},{row[6] or ''},{row[7] or ''},{row[8] or ''},{row[9] or ''},{row[10] or ''}\n"
-        
-        conn.close()
-        
-        from flask import Response
-        return Response(
-            csv_content,
-            mimetype='text/csv',
-            headers={'Content-Disposition': 'attachment; filename=leads_export.csv'}
-        )
-    except Exception as e:
-        logger.error(f"Error exporting leads: {str(e)}")
-        return jsonify({'error': 'Failed to export leads'}), 500
+    """
+    Export leads as CSV (default), NDJSON (format=ndjson) or a NumPy structured array (format=npy),
+    optionally compressed with compression=gzip or compression=zstd
+    """
+    output_format = request.args.get('format', 'csv')
+    compression = request.args.get('compression') or None
+    if output_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    if compression not in (None, 'gzip', 'zstd'):
+        return jsonify({'error': 'compression must be gzip or zstd'}), 400
+    if compression == 'zstd' and zstandard is None:
+        return jsonify({'error': 'zstd compression is not available on this server'}), 400
+    if not isinstance(lead_store, SQLiteLeadStore):
+        return jsonify({'error': 'Exports require the SQLite storage backend'}), 501
+
+    mimetype, extension = EXPORT_FORMATS[output_format]
+    filename = f"leads_export.{extension}"
+    if compression:
+        filename += f".{COMPRESSION_EXTENSIONS[compression]}"
+        mimetype = 'application/octet-stream'
+
+    def generate():
+        conn = lead_store.connect()
+        try:
+            # One read snapshot for the whole export (WAL mode keeps writers unblocked)
+            conn.execute('BEGIN')
+            yield from compress_chunks(EXPORTERS[output_format](conn), compression)
+        except Exception as e:
+            logger.error(f"Error exporting leads: {str(e)}")
+            # Headers are already sent; re-raising aborts the chunked response so clients see a
+            # failed download rather than a truncated file with a 200
+            raise
+        finally:
+            conn.close()
+
+    return Response(
+        generate(),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f"attachment; filename={filename}"}
+    )
+
+# Bulk import settings
+BULK_IMPORT_BATCH_SIZE = int(os.getenv('BULK_IMPORT_BATCH_SIZE', 1000))
+BULK_IMPORT_READ_SIZE = 64 * 1024
+# Longest row accepted; a body without newlines (or with CR-only line endings) aborts the import
+# instead of being buffered whole
+BULK_IMPORT_MAX_LINE_BYTES = 4 * BULK_IMPORT_READ_SIZE
+
+# A minus sign before the first digit of an imported amount ("-5", "$-5", "- 5,000")
+NEGATIVE_AMOUNT_PATTERN = re.compile(r'[\s$]*-\s*\$?\d')
+
+def normalize_lead_record(record: Any) -> Dict[str, Any]:
+    """Validate and normalize an imported applicant profile into lead data (raises ValueError)"""
+    if not isinstance(record, dict):
+        raise ValueError("Row is not a valid record")
+    lead_data = {}
+    for question, parsed in zip(LEAD_QUALIFICATION_QUESTIONS, qualification_flow.questions):
+        field_name = question['field']
+        raw_value = record.get(field_name)
+        if raw_value is None or str(raw_value).strip() == '':
+            continue
+        if question['type'] == 'number':
+            if isinstance(raw_value, (int, float)) and not isinstance(raw_value, bool):
+                value = float(raw_value)
+            else:
+                value = parsed.parse(str(raw_value))
+                # The answer parser ignores signs, so "-5" would otherwise be stored as 5
+                if value is not None and NEGATIVE_AMOUNT_PATTERN.match(str(raw_value)):
+                    value = -value
+            if value is None:
+                raise ValueError(f"{field_name} must be a number")
+            # JSON numbers skip the parser, and 1e309 loads as inf
+            if not math.isfinite(value) or value < 0:
+                raise ValueError(f"{field_name} must be a non-negative, finite amount")
+        elif parsed.kind == 'credit_score':
+            value = parsed.parse(str(raw_value))
+            if value is None:
+                raise ValueError("credit_score is not a recognized score or range")
+        else:
+            value = parsed.parse(str(raw_value))
+            if value is None:
+                raise ValueError(f"{field_name} must be one of: {', '.join(question['options'])}")
+        lead_data[field_name] = value
+    if 'annual_income' not in lead_data:
+        raise ValueError("annual_income is required")
+    return lead_data
+
+def iter_stream_lines(stream):
+    """
+    Yield decoded lines (with line endings) from a binary stream without buffering the whole body.
+    Raises ValueError once a line grows past BULK_IMPORT_MAX_LINE_BYTES.
+    """
+    pending = b''
+    while True:
+        chunk = stream.read(BULK_IMPORT_READ_SIZE)
+        if not chunk:
+            break
+        pending += chunk
+        lines = pending.split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line.decode('utf-8', errors='replace') + '\n'
+        if len(pending) > BULK_IMPORT_MAX_LINE_BYTES:
+            raise ValueError(f"Line longer than {BULK_IMPORT_MAX_LINE_BYTES} bytes")
+    if pending:
+        yield pending.decode('utf-8', errors='replace')
+
+def iter_bulk_records(stream, is_csv: bool):
+    """Yield (row_number, record) pairs from a CSV or NDJSON body; record is None if unparseable"""
+    lines = iter_stream_lines(stream)
+    if is_csv:
+        reader = csv.DictReader(lines)
+        if reader.fieldnames:
+            # Accept both field names and the export's headers ("Annual Income")
+            reader.fieldnames = [name.strip().lower().replace(' ', '_') for name in reader.fieldnames]
+        for row_number, record in enumerate(reader, start=1):
+            yield row_number, record
+        return
+    row_number = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            yield row_number, json.loads(line)
+        except ValueError:
+            yield row_number, None
+
+def import_lead_batch(batch, fixed_rate: float):
+    """Score, estimate and insert a batch of (row_number, record) pairs; returns per-row results"""
+    results = []
+    leads = []
+    for row_number, record in batch:
+        try:
+            lead_data = normalize_lead_record(record)
+        except ValueError as e:
+            results.append({'row': row_number, 'status': 'error', 'error': str(e)})
+            continue
+        session_id = str(record.get('session_id') or '').strip() or f"bulk_{uuid.uuid4().hex}"
+        contact_info = str(record.get('contact_info') or '').strip() or None
+        lead_score = score_lead(lead_data)
+        max_mortgage, max_property_value, monthly_payment = calculate_mortgage_figures(lead_data, fixed_rate)
+        leads.append(dict(lead_data, session_id=session_id, lead_score=lead_score, contact_info=contact_info))
+        results.append({
+            'row': row_number,
+            'status': 'ok',
+            'session_id': session_id,
+            'lead_score': lead_score,
+            'max_mortgage': round(max_mortgage, 2),
+            'max_property_value': round(max_property_value, 2),
+            'monthly_payment': round(monthly_payment, 2)
+        })
+    if leads:
+        lead_store.save_leads(leads)
+    return results
+
+@app.route('/api/leads/bulk', methods=['POST'])
+def bulk_import_leads():
+    """
+    Bulk import applicant profiles from a CSV or NDJSON body (for referral partner feeds).
+    Rows are validated, scored and inserted in batches; per-row results stream back as NDJSON.
+    """
+    is_csv = request.mimetype in ('text/csv', 'application/csv') or request.args.get('format') == 'csv'
+    stream = request.stream
+    fixed_rate = get_current_fixed_rate()
+
+    def generate():
+        imported = failed = 0
+        try:
+            batch = []
+            records = iter_bulk_records(stream, is_csv)
+            while True:
+                batch.clear()
+                for item in records:
+                    batch.append(item)
+                    if len(batch) >= BULK_IMPORT_BATCH_SIZE:
+                        break
+                if not batch:
+                    break
+                results = import_lead_batch(batch, fixed_rate)
+                for result in results:
+                    if result['status'] == 'ok':
+                        imported += 1
+                    else:
+                        failed += 1
+                yield ''.join(json.dumps(result) + '\n' for result in results)
+        except Exception as e:
+            logger.error(f"Error importing leads: {str(e)}")
+            yield json.dumps({'error': 'Bulk import aborted', 'imported': imported, 'failed': failed}) + '\n'
+            return
+        logger.info(f"Bulk import finished: {imported} imported, {failed} failed")
+        yield json.dumps({'summary': {'imported': imported, 'failed': failed}}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
 @app.route('/api/leads/stats', methods=['GET'])
 def get_lead_stats():
     """Get lead statistics"""
     try:
-        conn = sqlite3.connect('leads.db')
-        cursor = conn.cursor()
-        
-        # Total leads
-        cursor.execute('SELECT COUNT(*) FROM leads')
-        total_leads = cursor.fetchone()[0]
-        
-        # Leads by score
-        cursor.execute('SELECT lead_score, COUNT(*) FROM leads GROUP BY lead_score')
-        leads_by_score = dict(cursor.fetchall())
-        
-        # Recent leads (last 7 days)
-        cursor.execute('''
-            SELECT COUNT(*) FROM leads 
-            WHERE created_at >= datetime('now', '-7 days')
-        ''')
-        recent_leads = cursor.fetchone()[0]
-        
-        conn.close()
-        
-        return jsonify({
-            'total_leads': total_leads,
-            'leads_by_score': leads_by_score,
-            'recent_leads': recent_leads
-        })
+        return jsonify(lead_store.lead_stats())
     except Exception as e:
         logger.error(f"Error fetching lead stats: {str(e)}")
         return jsonify({'error': 'Failed to fetch lead statistics'}), 500
 
+@app.route('/api/faq/stats', methods=['GET'])
+def get_faq_stats():
+    """FAQ tier hit rate and estimated OpenAI latency saved (this worker only)"""
+    lookups = faq_stats['hits'] + faq_stats['misses']
+    if faq_stats['llm_calls']:
+        avg_llm_seconds = faq_stats['llm_seconds'] / faq_stats['llm_calls']
+    else:
+        avg_llm_seconds = FAQ_LLM_LATENCY_ESTIMATE
+    avg_lookup_seconds = faq_stats['lookup_seconds'] / lookups if lookups else 0.0
+    return jsonify({
+        'enabled': FAQ_ENABLED and faq_index is not None,
+        'min_confidence': FAQ_MIN_CONFIDENCE,
+        'hits': faq_stats['hits'],
+        'misses': faq_stats['misses'],
+        'hit_rate': faq_stats['hits'] / lookups if lookups else 0.0,
+        'avg_lookup_ms': avg_lookup_seconds * 1000,
+        'avg_llm_ms': avg_llm_seconds * 1000,
+        'estimated_seconds_saved': faq_stats['hits'] * max(0.0, avg_llm_seconds - avg_lookup_seconds)
+    })
+
+@app.route('/api/outbound/stats', methods=['GET'])
+def get_outbound_stats():
+    """Outbound HTTP connection reuse and handshake times per host (this worker only)"""
+    return jsonify({'hosts': http_client.stats()})
+
 @app.route('/api/rates', methods=['GET'])
 def get_rates():
     """Get the current mortgage rates."""
     try:
-        conn = sqlite3.connect('leads.db')
-        cursor = conn.cursor()
-        cursor.execute('SELECT fixed_rate, variable_rate, three_year_fixed_rate, updated_at FROM rates WHERE id = 1')
-        row = cursor.fetchone()
-        conn.close()
-        if row:
-            return jsonify({
-                'fixed_rate': row[0],
-                'variable_rate': row[1],
-                'three_year_fixed_rate': row[2],
-                'updated_at': row[3]
-            })
+        rates = lead_store.get_rates()
+        if rates:
+            return jsonify(rates)
         else:
             return jsonify({'error': 'Rates not found'}), 404
     except Exception as e:
@@ -814,18 +1145,41 @@ def update_rates():
         fixed_rate = float(data.get('fixed_rate'))
         variable_rate = float(data.get('variable_rate'))
         three_year_fixed_rate = float(data.get('three_year_fixed_rate'))
-        conn = sqlite3.connect('leads.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE rates SET fixed_rate = ?, variable_rate = ?, three_year_fixed_rate = ?, updated_at = CURRENT_TIMESTAMP WHERE id = 1
-        ''', (fixed_rate, variable_rate, three_year_fixed_rate))
-        conn.commit()
-        conn.close()
+        lead_store.update_rates(fixed_rate, variable_rate, three_year_fixed_rate)
         return jsonify({'success': True, 'fixed_rate': fixed_rate, 'variable_rate': variable_rate, 'three_year_fixed_rate': three_year_fixed_rate})
     except Exception as e:
         logger.error(f"Error updating rates: {str(e)}")
         return jsonify({'error': 'Failed to update rates'}), 500
 
+@app.route('/api/profiles', methods=['GET'])
+def list_profiles():
+    """List stored request profiles, newest first (admin purposes)"""
+    if profile_store is None:
+        return jsonify({'enabled': False, 'profiles': []})
+    return jsonify({'enabled': True, 'profiles': profile_store.list()})
+
+@app.route('/api/profiles/<profile_id>', methods=['GET'])
+def download_profile(profile_id):
+    """Download a profile as pstats (default, for snakeviz/pstats) or collapsed stacks (format=collapsed)"""
+    if profile_store is None:
+        return jsonify({'error': 'Profiling is not enabled'}), 404
+    try:
+        if not os.path.exists(profile_store.path(profile_id, 'prof')):
+            return jsonify({'error': 'Profile not found'}), 404
+        if request.args.get('format') == 'collapsed':
+            stacks = collapsed_stacks(profile_store.load_stats(profile_id))
+            return Response(
+                stacks,
+                mimetype='text/plain',
+                headers={'Content-Disposition': f"attachment; filename={profile_id}.collapsed.txt"}
+            )
+        return send_from_directory(profile_store.directory, f"{profile_id}.prof", as_attachment=True)
+    except ValueError:
+        return jsonify({'error': 'Profile not found'}), 404
+    except Exception as e:
+        logger.error(f"Error loading profile {profile_id}: {str(e)}")
+        return jsonify({'error': 'Failed to load profile'}), 500
+
 @app.route('/admin.html')
 def serve_admin():
     return send_from_directory('.', 'admin.html')
@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for Burnaby Home Loans Chatbot API components
+Usage: python benchmark.py <benchmark> [options]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+
+def report(name: str, timings_ns):
+    """Print mean and tail latency in microseconds"""
+    timings_us = sorted(t / 1000 for t in timings_ns)
+    count = len(timings_us)
+    print(
+        f"{name:<32} n={count:<8} mean={statistics.fmean(timings_us):8.2f}us "
+        f"p50={timings_us[count // 2]:8.2f}us p99={timings_us[int(count * 0.99)]:8.2f}us "
+        f"max={timings_us[-1]:8.2f}us"
+    )
+
+
+def start_tls_stub_server(directory: str):
+    """
+    HTTPS server on 127.0.0.1 with a throwaway self-signed certificate (needs the openssl CLI),
+    answering like OpenAI's chat completions endpoint. Returns (server, base_url, cert_path).
+    """
+    import json
+    import ssl
+    import subprocess
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    cert_path = os.path.join(directory, 'stub.pem')
+    key_path = os.path.join(directory, 'stub.key')
+    subprocess.run([
+        'openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+        '-keyout', key_path, '-out', cert_path, '-subj', '/CN=127.0.0.1',
+        '-addext', 'subjectAltName=IP:127.0.0.1'
+    ], check=True, capture_output=True)
+
+    body = json.dumps({
+        'id': 'chatcmpl-stub',
+        'object': 'chat.completion',
+        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': 'Stub answer.'}, 'finish_reason': 'stop'}]
+    }).encode('utf-8')
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Send headers and body in one segment (avoids Nagle / delayed-ACK stalls on keep-alive)
+        wbufsize = 64 * 1024
+
+        def _reply(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            if length:
+                self.rfile.read(length)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        do_GET = do_POST = _reply
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert_path, key_path)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"https://127.0.0.1:{server.server_address[1]}", cert_path
+
+
+def bench_outbound(args):
+    """
+    OpenAI chat completions against a local TLS stub: a new connection per call (what a
+    fresh requests session per call pays) versus the shared pooled client, with its reuse
+    and handshake metrics.
+    """
+    import openai
+    import requests
+    from http_client import PooledHTTPClient
+
+    calls = min(args.requests, 2000)
+    with tempfile.TemporaryDirectory() as tmp:
+        server, base_url, cert_path = start_tls_stub_server(tmp)
+        url = f"{base_url}/v1/chat/completions"
+        payload = {'model': 'gpt-3.5-turbo', 'messages': [{'role': 'user', 'content': 'hi'}]}
+
+        timings = []
+        for _ in range(calls):
+            start = time.perf_counter_ns()
+            with requests.Session() as session:
+                session.post(url, json=payload, verify=cert_path, timeout=(3.05, 30)).json()
+            timings.append(time.perf_counter_ns() - start)
+        report("chat completion [new connection]", timings)
+
+        client = PooledHTTPClient()
+        client.session.verify = cert_path
+        # Don't let REQUESTS_CA_BUNDLE override the stub's certificate
+        client.session.trust_env = False
+        openai.requestssession = client.session
+        openai.api_key = 'stub'
+        openai.api_base = f"{base_url}/v1"
+        timings = []
+        for _ in range(calls):
+            start = time.perf_counter_ns()
+            openai.ChatCompletion.create(request_timeout=client.timeout(30), **payload)
+            timings.append(time.perf_counter_ns() - start)
+        report("chat completion [pooled]", timings)
+        for host, stats in client.stats().items():
+            print(f"{'':<32} {host}: {stats}")
+        client.close()
+        server.shutdown()
+
+
+def bench_rate_limit(args):
+    """Per-request overhead of the chatbot rate limiter (two buckets per check)"""
+    from rate_limiter import TokenBucketLimiter, SQLiteTokenBucketLimiter
+
+    budgets = {
+        'scripted_session': (20, 1.0),
+        'scripted_ip': (60, 4.0)
+    }
+    rng = random.Random(42)
+    keys = [(f"session_{rng.randrange(args.keys)}", f"10.0.{rng.randrange(256)}.{rng.randrange(256)}")
+            for _ in range(args.requests)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        limiters = [
+            ('memory', TokenBucketLimiter(budgets)),
+            ('sqlite', SQLiteTokenBucketLimiter(budgets, os.path.join(tmp, 'ratelimit.db')))
+        ]
+        for name, limiter in limiters:
+            timings = []
+            for session_id, ip in keys:
+                start = time.perf_counter_ns()
+                limiter.acquire((('scripted_session', session_id), ('scripted_ip', ip)))
+                timings.append(time.perf_counter_ns() - start)
+            report(f"rate-limit acquire [{name}]", timings)
+            print(f"{'':<32} tracked buckets={len(limiter)}")
+
+
+# Sample chat traffic: (message, expected FAQ id or None when it should go to OpenAI)
+FAQ_SAMPLE_QUERIES = [
+    ("current rates?", 'current_rates'),
+    ("what's the 5 year fixed rate today", 'current_rates'),
+    ("how do I get preapproved", 'pre_approval'),
+    ("what documents do i need", 'pre_approval_documents'),
+    ("first time buyer programs", 'first_time_buyer'),
+    ("how much down payment do I need", 'minimum_down_payment'),
+    ("what is cmhc insurance", 'mortgage_insurance'),
+    ("what is the stress test", 'stress_test'),
+    ("can you help me refinance", 'refinancing'),
+    ("do you do commercial mortgages", 'commercial_mortgages'),
+    ("which banks do you work with", 'lenders'),
+    ("how much do you charge", 'broker_cost'),
+    ("how much would my payment be on a 600k mortgage", None),
+    ("is now a good time to buy", None),
+    ("I have bad credit can I still get a mortgage", None),
+    ("I'm self employed, can I get a mortgage", None),
+    ("should i break my mortgage", None),
+    ("what rate would I get with a 700 credit score", None),
+    ("thanks!", None),
+    ("tell me a joke", None)
+]
+
+
+def bench_faq(args):
+    """FAQ lookup latency, hit rate and precision on sample chat traffic"""
+    from faq_index import FAQIndex
+
+    threshold = float(os.getenv('FAQ_MIN_CONFIDENCE', 0.45))
+    start = time.perf_counter_ns()
+    index = FAQIndex.from_file('faq.json')
+    print(f"faq index build: {(time.perf_counter_ns() - start) / 1e6:.2f}ms ({len(index.doc_entries)} questions)")
+
+    hits = correct = 0
+    for message, expected in FAQ_SAMPLE_QUERIES:
+        entry, confidence = index.search(message)
+        answered = entry['id'] if entry is not None and confidence >= threshold else None
+        hits += answered is not None
+        correct += answered == expected
+    print(f"faq hit rate: {hits}/{len(FAQ_SAMPLE_QUERIES)}, routed correctly: {correct}/{len(FAQ_SAMPLE_QUERIES)}")
+
+    timings = []
+    for i in range(args.requests):
+        message = FAQ_SAMPLE_QUERIES[i % len(FAQ_SAMPLE_QUERIES)][0]
+        start = time.perf_counter_ns()
+        index.search(message)
+        timings.append(time.perf_counter_ns() - start)
+    report("faq search", timings)
+
+
+def create_synthetic_leads_db(path: str, count: int, seed: int = 42):
+    """A leads database filled with `count` random but plausible leads"""
+    import sqlite3
+
+    rng = random.Random(seed)
+    credit_scores = ["Excellent (740+)", "Good (670-739)", "Fair (580-669)", "Poor below 580", "Not sure"]
+    timelines = ["Right away / Immediately", "0-3 months", "3-6 months", "Longer than 6 months", "Just exploring"]
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS leads (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            annual_income REAL,
+            down_payment REAL,
+            monthly_debt REAL,
+            credit_score TEXT,
+            property_costs REAL,
+            timeline TEXT,
+            lead_score TEXT,
+            contact_info TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_leads_created_at ON leads (created_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_leads_lead_score ON leads (lead_score)')
+    rows = (
+        (
+            f"session_{i}_{rng.getrandbits(32):08x}",
+            float(rng.randrange(40000, 250000, 1000)),
+            float(rng.randrange(0, 300000, 1000)),
+            float(rng.randrange(0, 3000, 50)),
+            rng.choice(credit_scores),
+            float(rng.randrange(100, 1200, 10)),
+            rng.choice(timelines),
+            rng.choice(("hot", "warm", "cold")),
+            None if i % 3 else f"lead{i}@example.com",
+            f"2025-{1 + i % 12:02d}-{1 + i % 28:02d} {i % 24:02d}:{i % 60:02d}:{(i * 7) % 60:02d}"
+        )
+        for i in range(count)
+    )
+    with conn:
+        conn.executemany('''
+            INSERT INTO leads (
+                session_id, annual_income, down_payment, monthly_debt,
+                credit_score, property_costs, timeline, lead_score, contact_info, created_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+    return conn
+
+
+def bench_export(args):
+    """Export size and time per format, and how long an analyst takes to load the result"""
+    import csv
+    import gzip
+    import io
+    import json
+    import numpy as np
+    from lead_export import EXPORTERS, compress_chunks
+
+    def load_csv(data):
+        return list(csv.DictReader(io.StringIO(data.decode('utf-8'))))
+
+    def load_ndjson(data):
+        return [json.loads(line) for line in data.splitlines()]
+
+    def load_npy(data):
+        path = os.path.join(tmp, 'leads_export.npy')
+        with open(path, 'wb') as f:
+            f.write(data)
+        start = time.perf_counter()
+        loaded = np.load(path)
+        print(f"{'':<7}np.load from disk: {time.perf_counter() - start:.3f}s")
+        return loaded
+
+    loaders = {'csv': load_csv, 'ndjson': load_ndjson, 'npy': load_npy}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        conn = create_synthetic_leads_db(os.path.join(tmp, 'leads.db'), args.requests)
+        print(f"synthetic leads: {args.requests} in {time.perf_counter() - start:.2f}s")
+        for output_format, exporter in EXPORTERS.items():
+            for compression in (None, 'gzip'):
+                start = time.perf_counter()
+                conn.execute('BEGIN')
+                data = b''.join(compress_chunks(exporter(conn), compression))
+                conn.execute('COMMIT')
+                export_seconds = time.perf_counter() - start
+                start = time.perf_counter()
+                loaded = loaders[output_format](gzip.decompress(data) if compression else data)
+                load_seconds = time.perf_counter() - start
+                assert len(loaded) == args.requests
+                label = output_format + (f"+{compression}" if compression else '')
+                print(f"export {label:<12} size={len(data) / 1e6:8.1f}MB export={export_seconds:6.2f}s load={load_seconds:6.3f}s")
+        conn.close()
+
+
+def import_app():
+    """The Flask app with in-memory storage and no rate limiting or event log"""
+    os.environ.update({
+        'STORAGE_BACKEND': 'memory',
+        'RATE_LIMIT_ENABLED': 'false',
+        'EVENT_LOG_ENABLED': 'false',
+        'OPENAI_API_KEY': os.getenv('OPENAI_API_KEY') or 'benchmark'
+    })
+    import app
+    return app
+
+
+# Sample answers per question field, including ones the parser should reject
+QUALIFICATION_SAMPLE_ANSWERS = {
+    'annual_income': ["120000", "$95,000 a year", "about 120k", "1.2 million", "not telling"],
+    'down_payment': ["80,000", "50k", "$100000 saved", "none yet"],
+    'monthly_debt': ["0", "$450/month", "about 1.2k"],
+    'credit_score': ["720", "around 650", "excellent", "not sure", "no idea"],
+    'property_costs': ["400", "$350 per month", "200"],
+    'timeline': ["0-3 months", "right away", "3-6 months", "within 6 weeks", "just exploring", "no rush"]
+}
+
+
+def bench_qualification(args):
+    """Scripted qualification path: each compiled answer parser, then whole turns per question"""
+    chatbot = import_app()
+    flow = chatbot.qualification_flow
+    iterations = max(1, args.requests // 10)
+
+    for question in flow.questions:
+        answers = QUALIFICATION_SAMPLE_ANSWERS[question.field]
+        timings = []
+        for i in range(iterations):
+            answer = answers[i % len(answers)]
+            start = time.perf_counter_ns()
+            question.parse(answer)
+            timings.append(time.perf_counter_ns() - start)
+        report(f"parse {question.field} [{question.kind}]", timings)
+
+    # Whole scripted turns (intent checks + state machine), as chat_turn runs them minus Flask
+    for question in flow.questions:
+        answers = QUALIFICATION_SAMPLE_ANSWERS[question.field]
+        final = question.number == len(flow.questions)
+        timings = []
+        for i in range(iterations if not final else iterations // 10 or 1):
+            lead_data = {'annual_income': 120000.0, 'down_payment': 80000.0, 'monthly_debt': 300.0,
+                         'credit_score': "Good (670-739)", 'property_costs': 400.0}
+            state = dict(question.state)
+            start = time.perf_counter_ns()
+            chatbot.scripted_response(answers[i % len(answers)], f"bench_{i}", state, lead_data)
+            timings.append(time.perf_counter_ns() - start)
+        label = "estimate + save" if final else "next prompt"
+        report(f"turn q{question.number} ({label})", timings)
+
+
+def bench_replay(args):
+    """
+    Replay logged chat_request events (see event_log.py) through the Flask app and report
+    server-side latency per route. OpenAI is replaced by a canned reply after --llm-latency
+    seconds, storage is in memory and rate limiting is off, so only the app's own work is timed.
+    """
+    from types import SimpleNamespace
+
+    if not os.path.exists(args.log):
+        print(f"replay: no event log at {args.log} (set EVENT_LOG_PATH and chat with the app first)")
+        return
+    import openai
+    from event_log import read_events
+
+    chatbot = import_app()
+
+    llm_calls = []
+
+    def fake_completion(**kwargs):
+        llm_calls.append(kwargs)
+        if args.llm_latency:
+            time.sleep(args.llm_latency)
+        message = SimpleNamespace(content="Replayed answer.")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    openai.ChatCompletion.create = fake_completion
+    events = list(read_events(args.log, 'chat_request'))
+    if not events:
+        print(f"replay: no chat_request events in {args.log}")
+        return
+
+    client = chatbot.app.test_client()
+    timings = {}
+    start = time.perf_counter()
+    for i in range(args.requests):
+        event = events[i % len(events)]
+        calls_before = len(llm_calls)
+        request_start = time.perf_counter_ns()
+        response = client.post('/chatbot-api', json={
+            'message': event.get('message', ''),
+            'session_id': event.get('session_id', 'replay_session'),
+            'qualification_state': event.get('qualification_state') or {},
+            'lead_data': event.get('lead_data') or {}
+        })
+        elapsed = time.perf_counter_ns() - request_start
+        body = response.get_json(silent=True) or {}
+        if response.status_code != 200:
+            route = f"status {response.status_code}"
+        elif body.get('source') == 'faq':
+            route = 'faq'
+        elif len(llm_calls) > calls_before:
+            route = 'llm'
+        else:
+            route = 'scripted'
+        timings.setdefault(route, []).append(elapsed)
+    total = time.perf_counter() - start
+    print(f"replay: {len(events)} logged requests, {args.requests} replayed in {total:.2f}s "
+          f"({args.requests / total:,.0f} req/sec)")
+    for route, route_timings in sorted(timings.items()):
+        report(f"  {route}", route_timings)
+
+
+def bench_storage(args):
+    """
+    Same mixed workload against each lead store: chat traffic saving leads and reading rates,
+    with admin dashboard reads (stats, latest leads) and occasional rate updates.
+    """
+    from storage import InMemoryLeadStore, SQLiteLeadStore
+
+    operations = (
+        # (name, weight, call)
+        ('save_lead', 60, lambda store, i: store.save_lead({
+            'session_id': f"session_{i}",
+            'annual_income': 95000.0,
+            'down_payment': 60000.0,
+            'monthly_debt': 400.0,
+            'credit_score': "Good (670-739)",
+            'property_costs': 450.0,
+            'timeline': "0-3 months",
+            'lead_score': "warm"
+        })),
+        ('get_rates', 30, lambda store, i: store.get_rates()),
+        ('list_leads(50)', 5, lambda store, i: store.list_leads(50)),
+        ('lead_stats', 4, lambda store, i: store.lead_stats()),
+        ('update_rates', 1, lambda store, i: store.update_rates(5.5, 5.8, 5.2))
+    )
+    rng = random.Random(42)
+    schedule = rng.choices(range(len(operations)), weights=[weight for _, weight, _ in operations], k=args.requests)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        stores = [
+            ('memory', InMemoryLeadStore()),
+            ('sqlite', SQLiteLeadStore(os.path.join(tmp, 'leads.db')))
+        ]
+        for backend, store in stores:
+            store.initialize()
+            timings = [[] for _ in operations]
+            start = time.perf_counter()
+            for i, op in enumerate(schedule):
+                op_start = time.perf_counter_ns()
+                operations[op][2](store, i)
+                timings[op].append(time.perf_counter_ns() - op_start)
+            elapsed = time.perf_counter() - start
+            print(f"storage [{backend}]: {args.requests / elapsed:,.0f} ops/sec over {args.requests} ops")
+            for (name, _, _), op_timings in zip(operations, timings):
+                if op_timings:
+                    report(f"  {name}", op_timings)
+
+
+BENCHMARKS = {
+    'export': bench_export,
+    'faq': bench_faq,
+    'outbound': bench_outbound,
+    'qualification': bench_qualification,
+    'rate-limit': bench_rate_limit,
+    'replay': bench_replay,
+    'storage': bench_storage
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS) + ['all'])
+    parser.add_argument('--requests', type=int, default=100000, help='operations per benchmark')
+    parser.add_argument('--keys', type=int, default=5000, help='distinct sessions to simulate')
+    parser.add_argument('--log', default='logs/events.jsonl', help='event log to replay')
+    parser.add_argument('--llm-latency', type=float, default=0.0, help='seconds each replayed OpenAI call takes')
+    args = parser.parse_args()
+
+    names = sorted(BENCHMARKS) if args.benchmark == 'all' else [args.benchmark]
+    for name in names:
+        BENCHMARKS[name](args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Structured event log for the chatbot API
+Events are compact JSON lines ({"ts": ..., "event": ..., ...fields}). The request thread
+only samples and queues them; redaction, serialization and writing happen in batches on a
+background thread, with size-based rotation (events.jsonl -> events.jsonl.1 -> ...).
+Logging never blocks a request: when the queue is full, events are dropped and counted.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+REDACTED = '[redacted]'
+
+# Contact details users type into free-text messages
+EMAIL_PATTERN = re.compile(r'[\w.+-]+@[\w-]+\.[\w.-]+')
+# Runs of 10+ digits with phone punctuation; amounts like "90,000" or "5 year" are left alone
+PHONE_PATTERN = re.compile(r'\+?\(?\d[\d\s().-]{8,}\d')
+
+
+def scrub(text: str) -> str:
+    if '@' in text:
+        text = EMAIL_PATTERN.sub(REDACTED, text)
+    return PHONE_PATTERN.sub(REDACTED, text)
+
+
+class EventLogger:
+    """Sampled, redacted JSON-lines event log with a background batched writer"""
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = 10 * 1024 * 1024,
+        backups: int = 5,
+        sample_rate: float = 1.0,
+        redact_fields: Iterable[str] = (),
+        batch_size: int = 256,
+        flush_interval: float = 0.5,
+        queue_size: int = 10000
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.sample_rate = sample_rate
+        self.redact_fields = frozenset(redact_fields)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=queue_size)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'ab')
+        self._size = self._file.tell()
+        self._thread = threading.Thread(target=self._run, name='event-log-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def sampled(self, sample_key: Optional[str]) -> bool:
+        """Sample by key (e.g. session id) so whole conversations are kept or skipped together"""
+        if self.sample_rate >= 1:
+            return True
+        if sample_key is None:
+            return False
+        return zlib.crc32(sample_key.encode('utf-8')) % 10000 < self.sample_rate * 10000
+
+    def log(self, event: str, sample_key: Optional[str] = None, **fields):
+        if not self.sampled(sample_key):
+            return
+        record = {'ts': round(time.time(), 3), 'event': event}
+        for key, value in fields.items():
+            # Callers keep mutating dicts like lead_data after logging; snapshot them now
+            record[key] = dict(value) if isinstance(value, dict) else value
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _redact(self, value: Any) -> Any:
+        if isinstance(value, dict):
+            return {
+                key: REDACTED if key in self.redact_fields else self._redact(item)
+                for key, item in value.items()
+            }
+        if isinstance(value, list):
+            return [self._redact(item) for item in value]
+        if isinstance(value, str):
+            return scrub(value)
+        return value
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while batch[-1] is not None and len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            closing = batch[-1] is None
+            records = [record for record in batch if record is not None]
+            if records:
+                self._write(records)
+            if closing:
+                return
+
+    def _write(self, records):
+        data = ''.join(
+            json.dumps(self._redact(record), separators=(',', ':'), default=str) + '\n'
+            for record in records
+        ).encode('utf-8')
+        try:
+            if self._size and self._size + len(data) > self.max_bytes:
+                self._rotate()
+            self._file.write(data)
+            self._file.flush()
+            self._size += len(data)
+        except OSError as e:
+            logger.error(f"Event log write failed: {str(e)}")
+
+    def _rotate(self):
+        self._file.close()
+        for index in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, 'ab')
+        self._size = 0
+
+    def close(self):
+        """Flush queued events and stop the writer"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+        if not self._file.closed:
+            self._file.close()
+
+
+def read_events(path: str, event: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Yield events from a log file (rotated files can be read one by one, oldest first)"""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Partial last line if the process died mid-write
+                continue
+            if event is None or record.get('event') == event:
+                yield record
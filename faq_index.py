@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Local FAQ retrieval for the chatbot API
+A small BM25 index over broker-approved answers (faq.json), so common questions
+can be answered in-process instead of calling OpenAI.
+"""
+
+import json
+import math
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be can could do does for from have how i if in is it me my of on or our should so
+that the their there this to us we what when where which who why will with would you your yours im
+s t about just please
+""".split())
+
+# Informal spellings and abbreviations mapped to the corpus' vocabulary
+SYNONYMS = {
+    'neighborhood': 'neighbourhood',
+    'preapproval': 'pre',
+    'preapproved': 'pre',
+    'downpayment': 'down',
+    'refi': 'refinance',
+    'cmhc': 'insurance'
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords, with a light plural/-ing stem"""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        token = SYNONYMS.get(token, token)
+        if len(token) > 4 and token.endswith('ing'):
+            token = token[:-3]
+        elif len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class FAQIndex:
+    """BM25 index with one document per FAQ question paraphrase"""
+
+    def __init__(self, entries: List[Dict[str, Any]], k1: float = 1.2, b: float = 0.75):
+        self.entries = entries
+        self.k1 = k1
+        self.b = b
+        documents = []
+        self.doc_entries = []
+        for entry_index, entry in enumerate(entries):
+            for question in entry['questions']:
+                documents.append(tokenize(question))
+                self.doc_entries.append(entry_index)
+
+        self.avg_doc_length = sum(len(doc) for doc in documents) / max(1, len(documents))
+        document_frequency: Dict[str, int] = {}
+        for doc in documents:
+            for term in set(doc):
+                document_frequency[term] = document_frequency.get(term, 0) + 1
+        self.idf = {
+            term: math.log(1 + (len(documents) - df + 0.5) / (df + 0.5))
+            for term, df in document_frequency.items()
+        }
+
+        # term -> [(doc_id, precomputed BM25 term weight)]
+        self.postings: Dict[str, List[Tuple[int, float]]] = {}
+        for doc_id, doc in enumerate(documents):
+            length_norm = self.k1 * (1 - self.b + self.b * len(doc) / self.avg_doc_length)
+            for term in set(doc):
+                tf = doc.count(term)
+                weight = self.idf[term] * tf * (self.k1 + 1) / (tf + length_norm)
+                self.postings.setdefault(term, []).append((doc_id, weight))
+
+        # Score of each document against its own text, used to normalize confidence
+        self.self_scores = [0.0] * len(documents)
+        for term, postings in self.postings.items():
+            for doc_id, weight in postings:
+                self.self_scores[doc_id] += weight
+
+    @classmethod
+    def from_file(cls, path: str) -> 'FAQIndex':
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def search(self, query: str) -> Tuple[Optional[Dict[str, Any]], float]:
+        """
+        Return (entry, confidence) for the best match, where confidence in [0, 1] is the
+        BM25 share of the matched question covered times the share of query terms matched.
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return None, 0.0
+        scores: Dict[int, float] = {}
+        matched_terms: Dict[int, int] = {}
+        for term in terms:
+            for doc_id, weight in self.postings.get(term, ()):
+                scores[doc_id] = scores.get(doc_id, 0.0) + weight
+                matched_terms[doc_id] = matched_terms.get(doc_id, 0) + 1
+        if not scores:
+            return None, 0.0
+        best_doc, confidence = None, 0.0
+        for doc_id, score in scores.items():
+            doc_confidence = min(1.0, score / self.self_scores[doc_id]) * matched_terms[doc_id] / len(terms)
+            if doc_confidence > confidence:
+                best_doc, confidence = doc_id, doc_confidence
+        return self.entries[self.doc_entries[best_doc]], confidence
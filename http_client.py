@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Shared outbound HTTP client
+One requests.Session per worker for every outbound call (OpenAI, Calendly), with a
+keep-alive connection pool per host, separate connect and read timeouts, and retries
+with jittered exponential backoff. Connection setup is instrumented so reuse rates and
+TCP / TLS handshake times can be reported per host.
+"""
+
+import random
+import threading
+import time
+from typing import Any, Dict, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+# Transient statuses worth retrying (only for idempotent methods, see JitteredRetry)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class JitteredRetry(Retry):
+    """
+    urllib3 Retry with "full jitter" backoff: a random delay between 0 and the exponential
+    backoff, so workers retrying after the same failure don't hit the host in lockstep.
+    Read and status retries are limited to idempotent methods (Retry.DEFAULT_ALLOWED_METHODS);
+    connection failures are retried for any method since the request was never sent.
+    Retry-After waits are capped at max_retry_after seconds, since the retry sleeps on the
+    request thread (a Calendly 429 asking for a minute would otherwise hold a worker that long).
+    """
+
+    def __init__(self, *args, max_retry_after: float = 2.0, **kwargs):
+        self.max_retry_after = max_retry_after
+        super().__init__(*args, **kwargs)
+
+    def new(self, **kwargs) -> 'JitteredRetry':
+        retry = super().new(**kwargs)
+        retry.max_retry_after = self.max_retry_after
+        return retry
+
+    def get_backoff_time(self) -> float:
+        backoff = super().get_backoff_time()
+        return random.uniform(0, backoff) if backoff else 0
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        return min(retry_after, self.max_retry_after) if retry_after is not None else None
+
+
+class ConnectionMetrics:
+    """Per-host counts of completed and failed requests and new connections, with connect / TLS handshake times"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, Dict[str, float]] = {}
+
+    def _host(self, host: str) -> Dict[str, float]:
+        entry = self._hosts.get(host)
+        if entry is None:
+            entry = self._hosts[host] = {
+                'requests': 0,
+                'errors': 0,
+                'connections': 0,
+                'connect_seconds': 0.0,
+                'connect_max_seconds': 0.0,
+                'tls_seconds': 0.0,
+                'tls_max_seconds': 0.0
+            }
+        return entry
+
+    def record_request(self, host: str, failed: bool = False):
+        with self._lock:
+            self._host(host)['errors' if failed else 'requests'] += 1
+
+    def record_connection(self, host: str, connect_seconds: float, tls_seconds: float):
+        with self._lock:
+            entry = self._host(host)
+            entry['connections'] += 1
+            entry['connect_seconds'] += connect_seconds
+            entry['connect_max_seconds'] = max(entry['connect_max_seconds'], connect_seconds)
+            entry['tls_seconds'] += tls_seconds
+            entry['tls_max_seconds'] = max(entry['tls_max_seconds'], tls_seconds)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            hosts = {host: dict(entry) for host, entry in self._hosts.items()}
+        stats = {}
+        for host, entry in hosts.items():
+            connections = entry['connections']
+            requests_made = entry['requests']
+            stats[host] = {
+                'requests': requests_made,
+                'errors': entry['errors'],
+                'new_connections': connections,
+                # Requests served on an already-open connection (a retried request can open several)
+                'reused_connections': max(0, requests_made - connections),
+                'reuse_rate': round(max(0, requests_made - connections) / requests_made, 4) if requests_made else 0.0,
+                'avg_tcp_connect_ms': round((entry['connect_seconds'] - entry['tls_seconds']) / connections * 1000, 3) if connections else 0.0,
+                'avg_tls_handshake_ms': round(entry['tls_seconds'] / connections * 1000, 3) if connections else 0.0,
+                'max_connect_ms': round(entry['connect_max_seconds'] * 1000, 3),
+                'max_tls_handshake_ms': round(entry['tls_max_seconds'] * 1000, 3)
+            }
+        return stats
+
+
+def _instrumented_pool_class(pool_class, metrics: ConnectionMetrics):
+    """Subclass of a urllib3 pool whose connections time DNS + TCP connect and the TLS handshake"""
+
+    class InstrumentedConnection(pool_class.ConnectionCls):
+        def _new_conn(self):
+            start = time.perf_counter()
+            sock = super()._new_conn()
+            self._tcp_seconds = time.perf_counter() - start
+            return sock
+
+        def connect(self):
+            self._tcp_seconds = 0.0
+            start = time.perf_counter()
+            super().connect()
+            total = time.perf_counter() - start
+            # HTTPS connect() is the TCP connect (_new_conn) followed by the TLS handshake
+            tls_seconds = total - self._tcp_seconds if pool_class.scheme == 'https' else 0.0
+            metrics.record_connection(self.host, total, tls_seconds)
+
+    return type(f"Instrumented{pool_class.__name__}", (pool_class,), {'ConnectionCls': InstrumentedConnection})
+
+
+class InstrumentedAdapter(HTTPAdapter):
+    """HTTPAdapter whose pools report connection metrics"""
+
+    def __init__(self, metrics: ConnectionMetrics, **kwargs):
+        self.metrics = metrics
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _instrumented_pool_class(HTTPConnectionPool, self.metrics),
+            'https': _instrumented_pool_class(HTTPSConnectionPool, self.metrics)
+        }
+
+    def send(self, request, *args, **kwargs):
+        host = urlsplit(request.url).hostname or ''
+        try:
+            response = super().send(request, *args, **kwargs)
+        except requests.RequestException:
+            # Only completed requests count towards reuse
+            self.metrics.record_request(host, failed=True)
+            raise
+        self.metrics.record_request(host)
+        return response
+
+
+class SharedSession(requests.Session):
+    """
+    Session shared by every caller in the worker. openai 0.28 closes its session every few
+    minutes, which would drop the pool for everyone; only PooledHTTPClient.close() closes it.
+    """
+
+    def close(self):
+        pass
+
+    def shutdown(self):
+        super().close()
+
+
+class PooledHTTPClient:
+    """The worker's outbound HTTP client: pooled session, split timeouts, jittered retries, metrics"""
+
+    def __init__(
+        self,
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        connect_timeout: float = 3.05,
+        retries: int = 2,
+        backoff_factor: float = 0.25,
+        max_retry_after: float = 2.0
+    ):
+        self.connect_timeout = connect_timeout
+        self.metrics = ConnectionMetrics()
+        self.session = SharedSession()
+        adapter = InstrumentedAdapter(
+            self.metrics,
+            # pool_connections: hosts kept pooled; pool_maxsize: open connections kept per host
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=JitteredRetry(
+                total=retries,
+                connect=retries,
+                read=retries,
+                status=retries,
+                status_forcelist=RETRY_STATUSES,
+                backoff_factor=backoff_factor,
+                respect_retry_after_header=True,
+                max_retry_after=max_retry_after,
+                raise_on_status=False
+            )
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def timeout(self, read_timeout: float) -> Tuple[float, float]:
+        """(connect, read) timeout tuple as requests expects"""
+        return (self.connect_timeout, read_timeout)
+
+    def request(self, method: str, url: str, read_timeout: float, **kwargs) -> requests.Response:
+        return self.session.request(method, url, timeout=self.timeout(read_timeout), **kwargs)
+
+    def get(self, url: str, read_timeout: float, **kwargs) -> requests.Response:
+        return self.request('GET', url, read_timeout, **kwargs)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return self.metrics.snapshot()
+
+    def close(self):
+        self.session.shutdown()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Idempotency-Key support for the chatbot API
+Responses are remembered per key for a short time so a retried request (e.g. the widget
+resending the final qualification turn) gets the original answer instead of running again.
+The cache is per process; lead writes are also upserts, so a retry that reaches another
+worker still can't duplicate a lead.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+# Returned by begin() while the first request with a key is still being handled
+IN_PROGRESS = object()
+
+
+class IdempotencyCache:
+    """Bounded, expiring map of idempotency key -> completed response"""
+
+    def __init__(self, ttl: float = 600.0, max_keys: int = 10000):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        # key -> [started_at, response or None while in progress], oldest first
+        self._entries: "OrderedDict[Any, list]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def begin(self, key, now: Optional[float] = None):
+        """
+        None if the caller should handle the request (and later complete() or discard() the key),
+        IN_PROGRESS if the same key is being handled right now, otherwise the stored response.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                return IN_PROGRESS if entry[1] is None else entry[1]
+            self._entries[key] = [now, None]
+            while len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+            return None
+
+    def complete(self, key, response):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry[1] = response
+
+    def discard(self, key):
+        """Forget a key so a retry runs again (e.g. after an error)"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def _expire(self, now: float):
+        # Entries are in start order, so expired ones are always at the front
+        while self._entries:
+            started_at = next(iter(self._entries.values()))[0]
+            if now - started_at < self.ttl:
+                return
+            self._entries.popitem(last=False)
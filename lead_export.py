@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Streaming lead exports
+Each exporter reads the leads table in batches from one SQLite cursor and yields
+chunks of the output file, so memory stays flat however many leads there are.
+
+Formats:
+- csv: the original admin export columns
+- ndjson: one JSON object per lead, numbers kept as numbers
+- npy: a standard NumPy .npy file holding a structured array, one record per lead.
+  Load it with np.load('leads_export.npy') (or pandas.DataFrame(np.load(...))). Fields:
+  id int64; annual_income, down_payment, monthly_debt, property_costs float64 (NaN when
+  missing); session_id, credit_score, timeline, lead_score, contact_info fixed-width
+  UTF-8 bytes sized to the longest value (decode with .str.decode('utf-8') in pandas);
+  created_at datetime64[s] (NaT when missing).
+"""
+
+import csv
+import io
+import json
+import zlib
+from typing import Iterable, Iterator, Optional, Union
+
+import numpy as np
+
+try:
+    import zstandard
+except ImportError:  # optional, only needed for compression=zstd
+    zstandard = None
+
+EXPORT_BATCH_SIZE = 10000
+
+EXPORT_COLUMNS = (
+    'id', 'session_id', 'annual_income', 'down_payment', 'monthly_debt',
+    'credit_score', 'property_costs', 'timeline', 'lead_score', 'contact_info', 'created_at'
+)
+STRING_COLUMNS = ('session_id', 'credit_score', 'timeline', 'lead_score', 'contact_info')
+NUMERIC_DTYPES = {
+    'id': 'i8',
+    'annual_income': 'f8',
+    'down_payment': 'f8',
+    'monthly_debt': 'f8',
+    'property_costs': 'f8',
+    'created_at': 'M8[s]'
+}
+
+CSV_HEADER = (
+    'Session ID', 'Annual Income', 'Down Payment', 'Monthly Debt', 'Credit Score',
+    'Property Costs', 'Timeline', 'Lead Score', 'Contact Info', 'Created At'
+)
+
+EXPORT_FORMATS = {
+    # format: (mimetype, file extension)
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'npy': ('application/octet-stream', 'npy')
+}
+COMPRESSION_EXTENSIONS = {'gzip': 'gz', 'zstd': 'zst'}
+
+
+def iter_lead_batches(conn) -> Iterator[list]:
+    """Yield lists of up to EXPORT_BATCH_SIZE lead rows (EXPORT_COLUMNS order), newest first"""
+    cursor = conn.execute(f"SELECT {', '.join(EXPORT_COLUMNS)} FROM leads ORDER BY created_at DESC")
+    while True:
+        rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+        if not rows:
+            return
+        yield rows
+
+
+def iter_csv_chunks(conn) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    for rows in iter_lead_batches(conn):
+        # Drop the id column, which the CSV export has never included
+        writer.writerows(row[1:] for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_ndjson_chunks(conn) -> Iterator[str]:
+    for rows in iter_lead_batches(conn):
+        yield ''.join(json.dumps(dict(zip(EXPORT_COLUMNS, row))) + '\n' for row in rows)
+
+
+def export_dtype(conn) -> np.dtype:
+    """Structured dtype for the npy export, with string fields sized to the longest stored value in bytes"""
+    widths = conn.execute(
+        'SELECT ' + ', '.join(f"MAX(LENGTH(CAST({column} AS BLOB)))" for column in STRING_COLUMNS) + ' FROM leads'
+    ).fetchone()
+    string_widths = dict(zip(STRING_COLUMNS, widths))
+    return np.dtype([
+        (column, f"S{max(1, string_widths[column] or 1)}" if column in STRING_COLUMNS else NUMERIC_DTYPES[column])
+        for column in EXPORT_COLUMNS
+    ])
+
+
+def iter_npy_chunks(conn) -> Iterator[bytes]:
+    """
+    Stream a .npy file: the header (which needs the row count up front), then each batch's
+    records as raw bytes. Run inside a transaction so the count and rows come from one snapshot.
+    """
+    count = conn.execute('SELECT COUNT(*) FROM leads').fetchone()[0]
+    dtype = export_dtype(conn)
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(header, {
+        'descr': np.lib.format.dtype_to_descr(dtype),
+        'fortran_order': False,
+        'shape': (count,)
+    })
+    yield header.getvalue()
+
+    written = 0
+    for rows in iter_lead_batches(conn):
+        rows = rows[:count - written]
+        batch = np.empty(len(rows), dtype=dtype)
+        for column, values in zip(EXPORT_COLUMNS, zip(*rows)):
+            if column in STRING_COLUMNS:
+                batch[column] = [b'' if value is None else str(value).encode('utf-8') for value in values]
+            else:
+                # None becomes NaN / NaT
+                batch[column] = np.array(values, dtype=NUMERIC_DTYPES[column])
+        written += len(rows)
+        yield batch.tobytes()
+
+
+def compress_chunks(chunks: Iterable[Union[str, bytes]], compression: Optional[str]) -> Iterator[bytes]:
+    """Encode chunks to bytes, optionally gzip- or zstd-compressing them as a single stream"""
+    if compression == 'gzip':
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    elif compression == 'zstd':
+        compressor = zstandard.ZstdCompressor(level=3).compressobj()
+    else:
+        compressor = None
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        if compressor is None:
+            yield chunk
+            continue
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    if compressor is not None:
+        yield compressor.flush()
+
+
+EXPORTERS = {
+    'csv': iter_csv_chunks,
+    'ndjson': iter_ndjson_chunks,
+    'npy': iter_npy_chunks
+}
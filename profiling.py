@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+On-demand request profiling for the chatbot API
+Profiles are cProfile captures stored in a bounded on-disk ring buffer, each with a
+JSON sidecar describing the request. Requests are profiled when they carry a valid
+admin-signed X-Profile-Signature header, or when picked by PROFILE_SAMPLE_RATE.
+
+Generate a signature (valid for --ttl seconds) with:
+    PROFILE_SECRET=... python profiling.py sign --ttl 600
+"""
+
+import argparse
+import hashlib
+import hmac
+import io
+import json
+import marshal
+import os
+import pstats
+import sys
+import time
+import uuid
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Phase name -> (source file, function name) whose cumulative time is reported for that phase.
+# Files in this package are matched by absolute path (a bare 'app.py' suffix also matches
+# flask/app.py); library files by their path relative to site-packages.
+PHASE_FUNCTIONS = {
+    'rate_limit': (os.path.join(PACKAGE_DIR, 'app.py'), 'check_rate_limit'),
+    'faq': (os.path.join(PACKAGE_DIR, 'app.py'), 'answer_from_faq'),
+    'llm': (os.path.join('openai', 'api_resources', 'chat_completion.py'), 'create'),
+    'save_lead': (os.path.join(PACKAGE_DIR, 'app.py'), 'save_lead_to_database'),
+    'estimate': (os.path.join(PACKAGE_DIR, 'app.py'), 'calculate_mortgage_estimate'),
+    'amortization': (os.path.join(PACKAGE_DIR, 'amortization.py'), 'amortization_schedule')
+}
+
+
+def sign_profile_request(secret: str, expires_at: int) -> str:
+    """Header value authorizing profiling until `expires_at` (unix seconds)"""
+    digest = hmac.new(secret.encode('utf-8'), str(expires_at).encode('utf-8'), hashlib.sha256).hexdigest()
+    return f"{expires_at}.{digest}"
+
+
+def verify_profile_signature(secret: str, signature: str, now: Optional[float] = None) -> bool:
+    try:
+        expires_at, _ = signature.split('.', 1)
+        expires_at = int(expires_at)
+    except ValueError:
+        return False
+    if expires_at < (now if now is not None else time.time()):
+        return False
+    return hmac.compare_digest(sign_profile_request(secret, expires_at), signature)
+
+
+def _source_matches(filename: str, source: str) -> bool:
+    if os.path.isabs(source):
+        return os.path.abspath(filename) == source
+    return filename.endswith(os.sep + source)
+
+
+def phase_timings(stats: pstats.Stats) -> Dict[str, float]:
+    """Cumulative milliseconds spent in each known phase, taken from the profile itself"""
+    timings = {}
+    for (filename, _, function_name), (_, _, _, cumulative, _) in stats.stats.items():
+        for phase, (source, name) in PHASE_FUNCTIONS.items():
+            if function_name == name and _source_matches(filename, source):
+                timings[phase] = round(timings.get(phase, 0.0) + cumulative * 1000, 3)
+    return timings
+
+
+@lru_cache(maxsize=4096)
+def _display_path(filename: str) -> str:
+    """Path relative to this package, or to the sys.path entry it was imported from (flask/app.py)"""
+    if filename.startswith('<'):
+        # <frozen ...>, <string>
+        return filename
+    path = os.path.abspath(filename)
+    roots = [PACKAGE_DIR] + [os.path.abspath(entry) for entry in sys.path if entry]
+    within = [root for root in roots if path.startswith(root.rstrip(os.sep) + os.sep)]
+    # The longest root wins, so a virtualenv inside the package still gives flask/app.py
+    return os.path.relpath(path, max(within, key=len)) if within else path
+
+
+def _frame_label(func) -> str:
+    filename, line, name = func
+    if filename == '~':
+        # Built-ins are recorded as ('~', 0, '<built-in method ...>')
+        return name
+    return f"{_display_path(filename)}:{name}:{line}"
+
+
+def collapsed_stacks(stats: pstats.Stats, min_microseconds: int = 1, max_depth: int = 64) -> str:
+    """
+    Convert a profile to flamegraph.pl / speedscope collapsed stacks ("a;b;c <microseconds>").
+    cProfile records caller->callee edges rather than full stacks, so time is apportioned
+    down each path by the share of the callee's cumulative time coming from that caller.
+    """
+    callees: Dict[Any, Dict[Any, float]] = {}
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, {})[func] = edge[3]
+    roots = [func for func, entry in stats.stats.items() if not entry[4]]
+
+    lines: Dict[str, float] = {}
+
+    def walk(func, path: List[str], on_stack: set, scale: float):
+        _, _, self_time, cumulative, _ = stats.stats[func]
+        label = ';'.join(path)
+        lines[label] = lines.get(label, 0.0) + self_time * scale
+        if len(path) >= max_depth:
+            return
+        for callee, edge_time in callees.get(func, {}).items():
+            if callee in on_stack:
+                continue
+            callee_cumulative = stats.stats[callee][3]
+            if not callee_cumulative:
+                continue
+            child_scale = scale * edge_time / callee_cumulative
+            if edge_time * scale * 1e6 < min_microseconds:
+                continue
+            on_stack.add(callee)
+            walk(callee, path + [_frame_label(callee)], on_stack, child_scale)
+            on_stack.discard(callee)
+
+    for root in roots:
+        walk(root, [_frame_label(root)], {root}, 1.0)
+
+    return ''.join(
+        f"{label} {int(seconds * 1e6)}\n"
+        for label, seconds in sorted(lines.items())
+        if seconds * 1e6 >= min_microseconds
+    )
+
+
+class ProfileStore:
+    """Bounded on-disk ring buffer of profiles: <id>.prof (marshalled pstats) plus <id>.json metadata"""
+
+    def __init__(self, directory: str, max_entries: int = 100):
+        self.directory = directory
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+
+    def new_id(self) -> str:
+        # Zero-padded millisecond timestamps keep ids in chronological order when sorted
+        return f"{int(time.time() * 1000):013d}_{os.getpid()}_{uuid.uuid4().hex[:6]}"
+
+    def save(self, profiler, metadata: Dict[str, Any], profile_id: Optional[str] = None) -> str:
+        """Store a finished profile; profile_id lets callers hand out the id before saving"""
+        profile_id = profile_id or self.new_id()
+        profiler.create_stats()
+        stats = pstats.Stats(profiler, stream=io.StringIO())
+        data = marshal.dumps(stats.stats)
+        metadata = dict(metadata, id=profile_id, size_bytes=len(data), phases_ms=phase_timings(stats))
+        with open(self.path(profile_id, 'prof'), 'wb') as f:
+            f.write(data)
+        with open(self.path(profile_id, 'json'), 'w') as f:
+            json.dump(metadata, f)
+        self._trim()
+        return profile_id
+
+    def path(self, profile_id: str, extension: str) -> str:
+        # Ids are generated here, but they come back in URLs - never let one escape the directory
+        if os.path.basename(profile_id) != profile_id or profile_id.startswith('.'):
+            raise ValueError("Invalid profile id")
+        return os.path.join(self.directory, f"{profile_id}.{extension}")
+
+    def ids(self) -> List[str]:
+        return sorted(name[:-5] for name in os.listdir(self.directory) if name.endswith('.json'))
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Metadata for stored profiles, newest first"""
+        profiles = []
+        for profile_id in reversed(self.ids()):
+            try:
+                with open(self.path(profile_id, 'json')) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                # Trimmed by another worker while listing
+                continue
+        return profiles
+
+    def load_stats(self, profile_id: str) -> pstats.Stats:
+        # .prof files use the same marshal format as Profile.dump_stats
+        return pstats.Stats(self.path(profile_id, 'prof'), stream=io.StringIO())
+
+    def _trim(self):
+        for profile_id in self.ids()[:-self.max_entries]:
+            for extension in ('json', 'prof'):
+                try:
+                    os.remove(self.path(profile_id, extension))
+                except OSError:
+                    pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Profiling helpers')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    sign = subparsers.add_parser('sign', help='print an X-Profile-Signature header value')
+    sign.add_argument('--ttl', type=int, default=600, help='seconds the signature stays valid')
+    args = parser.parse_args()
+
+    secret = os.getenv('PROFILE_SECRET')
+    if not secret:
+        parser.error('PROFILE_SECRET is not set')
+    print(sign_profile_request(secret, int(time.time()) + args.ttl))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Lead qualification flow engine
+The questions are declared in app.py (LEAD_QUALIFICATION_QUESTIONS). QualificationFlow
+compiles them once at startup: each question's answer parser is built up front (amounts
+with k/M suffixes, credit scores bucketed by range, select options through a token -> option
+index) and every prompt and qualification_state the flow can return is pre-rendered, so a
+scripted turn is a parse plus a few dictionary lookups.
+
+Question keys used here: field, question, type ('number' or 'select'), options, and
+optionally parser ('amount', 'credit_score' or 'option'; defaults by type), buckets and
+keywords (credit_score parser), and reprompt (a template overriding the default retry
+prompt, rendered with {number}, {total}, {question} and {options} joined by "; ").
+"""
+
+import bisect
+import re
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+# First number in an answer, with an optional thousands / millions suffix ("120k", "1.2 million")
+AMOUNT_PATTERN = re.compile(r'(\d+(?:\.\d+)?)(?:\s*(k|thousand|million|mil|mm|m)\b)?', re.IGNORECASE)
+AMOUNT_MULTIPLIERS = {
+    'k': 1e3,
+    'thousand': 1e3,
+    'm': 1e6,
+    'mm': 1e6,
+    'mil': 1e6,
+    'million': 1e6
+}
+
+# Words, numbers and ranges like "0-3" or "740+"
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+(?:-[a-z0-9]+)*\+?')
+
+# Answers that accept the offer to start qualifying (matched anywhere in the message)
+ACCEPT_PATTERN = re.compile(r'yes|yeah|sure|okay|ok|yep')
+
+START_PREFIX = "Great! Let's get started. "
+DECLINED_CONTENT = "No problem! How else can I help you with your mortgage questions today?"
+NUMBER_REPROMPT = "I need a number for that. Could you please provide a numeric value?"
+
+
+def parse_number(text: str) -> Optional[float]:
+    """First number in the text, ignoring thousands separators"""
+    match = AMOUNT_PATTERN.search(text.replace(',', ''))
+    return float(match.group(1)) if match else None
+
+
+def parse_amount(text: str) -> Optional[float]:
+    """First number in the text, scaled by a k / M / thousand / million suffix if present"""
+    match = AMOUNT_PATTERN.search(text.replace(',', ''))
+    if not match:
+        return None
+    value = float(match.group(1))
+    suffix = match.group(2)
+    return value * AMOUNT_MULTIPLIERS[suffix.lower()] if suffix else value
+
+
+def compile_credit_score_parser(buckets, keywords) -> Callable[[str], Optional[str]]:
+    """
+    Parser for credit score answers. An option quoted in full wins (so "Poor below 580" isn't
+    read as a score of 580). Otherwise `buckets` are (lowest score, option) pairs and a number in
+    the answer picks the bucket it falls in; failing that the first (keyword, option) whose
+    keyword appears in the answer wins.
+    """
+    buckets = sorted(buckets)
+    lower_bounds = [low for low, _ in buckets]
+    bucket_options = [option for _, option in buckets]
+    keywords = tuple(keywords)
+    # Longest first, so an option containing another one is matched whole
+    quoted = sorted(
+        {(option.lower(), option) for option in bucket_options + [option for _, option in keywords]},
+        key=lambda item: (-len(item[0]), item[0])
+    )
+
+    def parse(text: str) -> Optional[str]:
+        message = text.lower()
+        for option_lower, option in quoted:
+            if option_lower in message:
+                return option
+        score = parse_number(text)
+        if score is not None:
+            return bucket_options[max(0, bisect.bisect_right(lower_bounds, score) - 1)]
+        for keyword, option in keywords:
+            if keyword in message:
+                return option
+        return None
+
+    return parse
+
+
+def compile_option_parser(options) -> Callable[[str], Optional[str]]:
+    """
+    Parser for select answers. An option quoted in full wins (so "3-6 months" isn't taken as
+    "0-3 months"); otherwise each token of the answer is looked up in a token -> option index
+    and the earliest option matched is chosen.
+    """
+    options = tuple(options)
+    lowered = tuple((option.lower(), option) for option in options)
+    token_index: Dict[str, int] = {}
+    for position, option in enumerate(options):
+        for token in TOKEN_PATTERN.findall(option.lower()):
+            token_index.setdefault(token, position)
+
+    def parse(text: str) -> Optional[str]:
+        message = text.lower()
+        for option_lower, option in lowered:
+            if option_lower in message:
+                return option
+        best = None
+        for token in TOKEN_PATTERN.findall(message):
+            position = token_index.get(token)
+            if position is not None and (best is None or position < best):
+                best = position
+        return options[best] if best is not None else None
+
+    return parse
+
+
+PARSER_FACTORIES = {
+    'amount': lambda question: parse_amount,
+    'credit_score': lambda question: compile_credit_score_parser(question['buckets'], question['keywords']),
+    'option': lambda question: compile_option_parser(question['options'])
+}
+DEFAULT_PARSERS = {'number': 'amount', 'select': 'option'}
+
+
+class CompiledQuestion(NamedTuple):
+    number: int
+    field: str
+    kind: str
+    parse: Callable[[str], Any]
+    # Content when this question is asked next, and when its answer couldn't be parsed
+    prompt: str
+    reprompt: str
+    # qualification_state while this question is waiting for an answer
+    state: Dict[str, Any]
+
+
+class FlowTurn(NamedTuple):
+    response: Optional[Dict[str, Any]]
+    # True once the last answer is recorded; the caller scores the lead and builds the reply
+    completed: bool = False
+
+
+def _state(current_question: int, in_progress: bool = True, **extra) -> Dict[str, Any]:
+    return dict({'in_progress': in_progress, 'current_question': current_question, 'waiting_for_response': False}, **extra)
+
+
+class QualificationFlow:
+    """The question flow compiled into a state machine keyed on qualification_state['current_question']"""
+
+    def __init__(self, questions: List[Dict[str, Any]]):
+        total = len(questions)
+        self.questions: List[CompiledQuestion] = []
+        for number, question in enumerate(questions, 1):
+            parser = question.get('parser') or DEFAULT_PARSERS[question['type']]
+            if 'reprompt' in question:
+                reprompt = question['reprompt'].format(
+                    number=number,
+                    total=total,
+                    question=question['question'],
+                    options='; '.join(question['options'] or ())
+                )
+            elif question['type'] == 'number':
+                reprompt = NUMBER_REPROMPT
+            else:
+                reprompt = "Please select one of these options:\n" + "\n".join(f"- {option}" for option in question['options'])
+            self.questions.append(CompiledQuestion(
+                number=number,
+                field=question['field'],
+                kind=parser,
+                parse=PARSER_FACTORIES[parser](question),
+                prompt=f"Question {number} of {total}. {question['question']}",
+                reprompt=reprompt,
+                state=_state(number)
+            ))
+        self.start_content = START_PREFIX + questions[0]['question']
+        self.declined_state = _state(0, in_progress=False)
+        self.completed_state = _state(0, in_progress=False, completed=True)
+
+    def start(self, lead_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Response that asks the first question (lead_data is echoed back when given)"""
+        response = {
+            'role': 'assistant',
+            'content': self.start_content,
+            'qualification_state': dict(self.questions[0].state)
+        }
+        if lead_data is not None:
+            response['lead_data'] = lead_data
+        return response
+
+    def handle(self, message: str, qualification_state: Dict[str, Any], lead_data: Dict[str, Any]) -> Optional[FlowTurn]:
+        """
+        Advance the flow with the user's message, recording parsed answers in lead_data.
+        None when the state isn't inside the flow, so the message is handled as normal chat.
+        """
+        if not qualification_state.get('in_progress'):
+            return None
+
+        # Answer to "would you like to see what you qualify for?"
+        if qualification_state.get('waiting_for_response'):
+            if ACCEPT_PATTERN.search(message.lower()):
+                return FlowTurn(self.start())
+            return FlowTurn({
+                'role': 'assistant',
+                'content': DECLINED_CONTENT,
+                'qualification_state': dict(self.declined_state)
+            })
+
+        current = qualification_state.get('current_question', 0)
+        if not isinstance(current, int) or not 1 <= current <= len(self.questions):
+            return None
+
+        question = self.questions[current - 1]
+        value = question.parse(message)
+        if value is None:
+            return FlowTurn({
+                'role': 'assistant',
+                'content': question.reprompt,
+                'qualification_state': qualification_state,
+                'lead_data': lead_data
+            })
+        lead_data[question.field] = value
+
+        if current == len(self.questions):
+            return FlowTurn(None, completed=True)
+        next_question = self.questions[current]
+        return FlowTurn({
+            'role': 'assistant',
+            'content': next_question.prompt,
+            'qualification_state': dict(next_question.state),
+            'lead_data': lead_data
+        })
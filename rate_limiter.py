@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Token-bucket rate limiting for the chatbot API
+Buckets are keyed by (budget, key) - e.g. ("llm_session", session_id) - so LLM-backed
+and scripted turns can be throttled separately per session and per client IP.
+"""
+
+import sqlite3
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# budget name -> (capacity, refill tokens per second)
+Budgets = Dict[str, Tuple[float, float]]
+
+
+class TokenBucketLimiter:
+    """In-process token buckets with idle-key eviction"""
+
+    def __init__(self, budgets: Budgets, max_keys: int = 50000):
+        self.budgets = budgets
+        self.max_keys = max_keys
+        # (budget, key) -> [tokens, last_refill_timestamp], least recently used first
+        self._buckets: "OrderedDict[Tuple[str, str], list]" = OrderedDict()
+        self._calls = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, requests: Iterable[Tuple[str, str]], cost: float = 1.0, now: Optional[float] = None) -> float:
+        """
+        Take `cost` tokens from every (budget, key) bucket, or from none of them.
+        Returns 0.0 when allowed, otherwise the seconds until the request would be allowed.
+        """
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+
+            buckets = []
+            retry_after = 0.0
+            for budget, key in requests:
+                capacity, rate = self.budgets[budget]
+                bucket = self._buckets.get((budget, key))
+                if bucket is None:
+                    bucket = self._buckets[(budget, key)] = [capacity, now]
+                else:
+                    bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+                    bucket[1] = now
+                    self._buckets.move_to_end((budget, key))
+                if bucket[0] < cost:
+                    retry_after = max(retry_after, (cost - bucket[0]) / rate)
+                buckets.append(bucket)
+
+            if retry_after:
+                return retry_after
+            for bucket in buckets:
+                bucket[0] -= cost
+            return 0.0
+
+    def _evict_idle(self, now: float, limit: int = 4):
+        """
+        Drop a few of the least recently used buckets if they have refilled completely
+        (a full bucket is equivalent to a new one), keeping each call O(1).
+        """
+        for _ in range(limit):
+            if not self._buckets:
+                return
+            bucket_key, (tokens, updated) = next(iter(self._buckets.items()))
+            capacity, rate = self.budgets[bucket_key[0]]
+            if len(self._buckets) <= self.max_keys and tokens + (now - updated) * rate < capacity:
+                return
+            self._buckets.popitem(last=False)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class SQLiteTokenBucketLimiter(TokenBucketLimiter):
+    """Token buckets stored in SQLite so all gunicorn workers share the same counters"""
+
+    def __init__(self, budgets: Budgets, db_path: str = 'ratelimit.db', sweep_every: int = 1024):
+        super().__init__(budgets)
+        self.db_path = db_path
+        self.sweep_every = sweep_every
+        self._conn = sqlite3.connect(db_path, timeout=1.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        # Counters are advisory; losing the last few writes on a crash is fine
+        self._conn.execute('PRAGMA synchronous=OFF')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS rate_limits (
+                bucket TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL
+            ) WITHOUT ROWID
+        ''')
+
+    def acquire(self, requests: Iterable[Tuple[str, str]], cost: float = 1.0, now: Optional[float] = None) -> float:
+        if now is None:
+            # Wall clock, since monotonic clocks aren't comparable across processes
+            now = time.time()
+        requests = list(requests)
+        names = [f"{budget}:{key}" for budget, key in requests]
+        with self._lock:
+            try:
+                self._conn.execute('BEGIN IMMEDIATE')
+                try:
+                    self._calls += 1
+                    if self._calls % self.sweep_every == 0:
+                        self._sweep(now)
+                    stored = dict(
+                        (name, (tokens, updated)) for name, tokens, updated in self._conn.execute(
+                            f"SELECT bucket, tokens, updated_at FROM rate_limits WHERE bucket IN ({','.join('?' * len(names))})",
+                            names
+                        )
+                    )
+                    levels = []
+                    retry_after = 0.0
+                    for (budget, _), name in zip(requests, names):
+                        capacity, rate = self.budgets[budget]
+                        if name in stored:
+                            tokens, updated = stored[name]
+                            tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+                        else:
+                            tokens = capacity
+                        if tokens < cost:
+                            retry_after = max(retry_after, (cost - tokens) / rate)
+                        levels.append(tokens)
+                    if not retry_after:
+                        levels = [tokens - cost for tokens in levels]
+                    self._conn.executemany('''
+                        INSERT INTO rate_limits (bucket, tokens, updated_at) VALUES (?, ?, ?)
+                        ON CONFLICT(bucket) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at
+                    ''', [(name, tokens, now) for name, tokens in zip(names, levels)])
+                    self._conn.execute('COMMIT')
+                except Exception:
+                    self._conn.execute('ROLLBACK')
+                    raise
+            except sqlite3.Error as e:
+                # Fail open: a locked or broken limiter database shouldn't take the chatbot down
+                logger.error(f"Rate limiter database error: {str(e)}")
+                return 0.0
+        return retry_after
+
+    def _sweep(self, now: float):
+        # A bucket untouched for longer than its slowest full refill is back at capacity
+        max_refill = max(capacity / rate for capacity, rate in self.budgets.values())
+        self._conn.execute('DELETE FROM rate_limits WHERE updated_at < ?', (now - max_refill,))
+
+    def __len__(self):
+        return self._conn.execute('SELECT COUNT(*) FROM rate_limits').fetchone()[0]
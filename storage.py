@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""
+Storage backends for leads, rates and lead statistics
+SQLiteLeadStore is what the app runs on; InMemoryLeadStore keeps everything in
+process for tests and benchmarks. Both return plain dicts keyed by column name.
+"""
+
+import argparse
+import bisect
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+LEAD_COLUMNS = (
+    'id', 'session_id', 'annual_income', 'down_payment', 'monthly_debt',
+    'credit_score', 'property_costs', 'timeline', 'lead_score', 'contact_info', 'created_at'
+)
+# Columns callers provide when saving; id and created_at are assigned by the store
+LEAD_INPUT_COLUMNS = LEAD_COLUMNS[1:-1]
+# Leads are unique per (session_id, attempt); attempt defaults to 0, so one lead per session
+LEAD_KEY_COLUMNS = ('session_id', 'attempt')
+# Stored for clients that send no session_id. Those leads can't be told apart, so they are
+# always inserted and never deduplicated (they're left out of the unique index)
+ANONYMOUS_SESSION_ID = 'default_session'
+# Rows per transaction when removing duplicate leads from databases created before the unique key
+DEDUPE_BATCH_SIZE = 1000
+
+DEFAULT_RATES = {'fixed_rate': 5.5, 'variable_rate': 5.8, 'three_year_fixed_rate': 5.2}
+
+
+def utc_timestamp(moment: Optional[datetime] = None) -> str:
+    """Timestamp in SQLite's CURRENT_TIMESTAMP format (UTC, 'YYYY-MM-DD HH:MM:SS')"""
+    return (moment or datetime.now(timezone.utc)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class LeadStore(ABC):
+    """Interface for lead, rate and statistics storage"""
+
+    def initialize(self):
+        """Create tables and defaults if needed"""
+
+    @abstractmethod
+    def save_lead(self, lead: Dict[str, Any]) -> int:
+        """
+        Upsert one lead (keys from LEAD_INPUT_COLUMNS, optional attempt) and return its id.
+        Saving the same session_id and attempt again updates that lead and keeps its id and created_at.
+        """
+
+    @abstractmethod
+    def save_leads(self, leads: Iterable[Dict[str, Any]]) -> int:
+        """Upsert many leads in one transaction and return how many were written"""
+
+    @abstractmethod
+    def list_leads(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Leads newest first, all LEAD_COLUMNS"""
+
+    @abstractmethod
+    def lead_stats(self) -> Dict[str, Any]:
+        """total_leads, leads_by_score and recent_leads (last 7 days)"""
+
+    @abstractmethod
+    def get_rates(self) -> Optional[Dict[str, Any]]:
+        """fixed_rate, variable_rate, three_year_fixed_rate and updated_at, or None"""
+
+    @abstractmethod
+    def update_rates(self, fixed_rate: float, variable_rate: float, three_year_fixed_rate: float):
+        """Replace the current rates"""
+
+
+class SQLiteLeadStore(LeadStore):
+    """
+    SQLite storage tuned for a small web app: WAL journaling, synchronous=NORMAL and one
+    long-lived connection per thread (so sqlite3's statement cache is reused across requests).
+    """
+
+    _upsert_sql = f'''
+        INSERT INTO leads ({', '.join(LEAD_INPUT_COLUMNS)}, attempt)
+        VALUES ({', '.join('?' * len(LEAD_INPUT_COLUMNS))}, ?)
+        ON CONFLICT ({', '.join(LEAD_KEY_COLUMNS)}) WHERE session_id != '{ANONYMOUS_SESSION_ID}' DO UPDATE SET
+            {', '.join(f"{column} = excluded.{column}" for column in LEAD_INPUT_COLUMNS if column != 'session_id')}
+    '''
+
+    def __init__(self, path: str = 'leads.db'):
+        self.path = path
+        self._local = threading.local()
+
+    def connect(self) -> sqlite3.Connection:
+        """A new tuned connection, e.g. for long-running exports that need their own transaction"""
+        conn = sqlite3.connect(self.path, timeout=5.0)
+        conn.execute('PRAGMA journal_mode=WAL')
+        # Durable across application crashes; WAL only risks the last commits on power loss
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        return conn
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self.connect()
+        return conn
+
+    def initialize(self):
+        with self.conn as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS leads (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL,
+                    annual_income REAL,
+                    down_payment REAL,
+                    monthly_debt REAL,
+                    credit_score TEXT,
+                    property_costs REAL,
+                    timeline TEXT,
+                    lead_score TEXT,
+                    contact_info TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    attempt INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            try:
+                # Databases created before leads were keyed on (session_id, attempt)
+                conn.execute('ALTER TABLE leads ADD COLUMN attempt INTEGER NOT NULL DEFAULT 0')
+            except sqlite3.OperationalError:
+                # Column already exists
+                pass
+            # Exports, stats and the admin list all sort or filter by created_at
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_leads_created_at ON leads (created_at)')
+            # Lets the stats GROUP BY read a small covering index instead of the table
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_leads_lead_score ON leads (lead_score)')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS rates (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    fixed_rate REAL,
+                    variable_rate REAL,
+                    three_year_fixed_rate REAL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            try:
+                # Databases created before the 3-year fixed rate existed
+                conn.execute('ALTER TABLE rates ADD COLUMN three_year_fixed_rate REAL DEFAULT 5.2')
+            except sqlite3.OperationalError:
+                # Column already exists
+                pass
+            conn.execute('''
+                INSERT OR IGNORE INTO rates (id, fixed_rate, variable_rate, three_year_fixed_rate)
+                VALUES (1, :fixed_rate, :variable_rate, :three_year_fixed_rate)
+            ''', DEFAULT_RATES)
+        self._migrate_unique_leads()
+
+    def _migrate_unique_leads(self):
+        """
+        One-time migration to the unique (session_id, attempt) key, which covers every lead
+        except anonymous ones. Duplicate leads are deleted (keeping the newest row of each key)
+        in short DEDUPE_BATCH_SIZE transactions so other workers can keep writing. The last
+        batch and the unique index share one transaction so no new duplicate can slip in between.
+        """
+        conn = self.conn
+        if conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_leads_client_session_attempt'"
+        ).fetchone():
+            return
+        with conn:
+            # Makes finding duplicates an index lookup; replaced by the unique index below
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_leads_session_dedupe ON leads (session_id, attempt)')
+        dedupe_sql = '''
+            DELETE FROM leads WHERE id IN (
+                SELECT id FROM leads AS older
+                WHERE older.session_id != :anonymous
+                AND EXISTS (
+                    SELECT 1 FROM leads AS newer
+                    WHERE newer.session_id = older.session_id
+                    AND newer.attempt = older.attempt
+                    AND newer.id > older.id
+                )
+                LIMIT :limit
+            )
+        '''
+        params = {'anonymous': ANONYMOUS_SESSION_ID, 'limit': DEDUPE_BATCH_SIZE}
+        while True:
+            with conn:
+                deleted = conn.execute(dedupe_sql, params).rowcount
+            if deleted < DEDUPE_BATCH_SIZE:
+                break
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            while conn.execute(dedupe_sql, params).rowcount:
+                pass
+            conn.execute(f'''
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_leads_client_session_attempt
+                ON leads (session_id, attempt) WHERE session_id != '{ANONYMOUS_SESSION_ID}'
+            ''')
+            # Earlier versions indexed anonymous leads too, which merged them into one row
+            conn.execute('DROP INDEX IF EXISTS idx_leads_session_attempt')
+            conn.execute('DROP INDEX IF EXISTS idx_leads_session_dedupe')
+            conn.execute('COMMIT')
+        except sqlite3.Error:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _upsert_row(self, lead: Dict[str, Any]) -> list:
+        return [lead.get(column) for column in LEAD_INPUT_COLUMNS] + [lead.get('attempt') or 0]
+
+    def save_lead(self, lead: Dict[str, Any]) -> int:
+        with self.conn as conn:
+            # lastrowid isn't set when the upsert updates an existing lead
+            return conn.execute(self._upsert_sql + ' RETURNING id', self._upsert_row(lead)).fetchone()[0]
+
+    def save_leads(self, leads: Iterable[Dict[str, Any]]) -> int:
+        rows = [self._upsert_row(lead) for lead in leads]
+        with self.conn as conn:
+            conn.executemany(self._upsert_sql, rows)
+        return len(rows)
+
+    def list_leads(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        cursor = self.conn.execute(
+            f"SELECT {', '.join(LEAD_COLUMNS)} FROM leads ORDER BY created_at DESC LIMIT ?",
+            (-1 if limit is None else limit,)
+        )
+        return [dict(zip(LEAD_COLUMNS, row)) for row in cursor]
+
+    def lead_stats(self) -> Dict[str, Any]:
+        conn = self.conn
+        total_leads = conn.execute('SELECT COUNT(*) FROM leads').fetchone()[0]
+        leads_by_score = dict(conn.execute('SELECT lead_score, COUNT(*) FROM leads GROUP BY lead_score').fetchall())
+        recent_leads = conn.execute(
+            "SELECT COUNT(*) FROM leads WHERE created_at >= datetime('now', '-7 days')"
+        ).fetchone()[0]
+        return {
+            'total_leads': total_leads,
+            'leads_by_score': leads_by_score,
+            'recent_leads': recent_leads
+        }
+
+    def get_rates(self) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute(
+            'SELECT fixed_rate, variable_rate, three_year_fixed_rate, updated_at FROM rates WHERE id = 1'
+        ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('fixed_rate', 'variable_rate', 'three_year_fixed_rate', 'updated_at'), row))
+
+    def update_rates(self, fixed_rate: float, variable_rate: float, three_year_fixed_rate: float):
+        with self.conn as conn:
+            conn.execute('''
+                UPDATE rates SET fixed_rate = ?, variable_rate = ?, three_year_fixed_rate = ?, updated_at = CURRENT_TIMESTAMP WHERE id = 1
+            ''', (fixed_rate, variable_rate, three_year_fixed_rate))
+
+
+class InMemoryLeadStore(LeadStore):
+    """Process-local storage for tests and benchmarks; nothing survives a restart"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._leads: List[Dict[str, Any]] = []
+        # (session_id, attempt) -> stored lead, for upserts
+        self._by_key: Dict[Any, Dict[str, Any]] = {}
+        # Parallel to _leads (already in created_at order) for bisecting; counts kept on insert
+        self._created_at: List[str] = []
+        self._score_counts: Dict[Any, int] = {}
+        self._rates: Optional[Dict[str, Any]] = None
+
+    def initialize(self):
+        with self._lock:
+            if self._rates is None:
+                self._rates = dict(DEFAULT_RATES, updated_at=utc_timestamp())
+
+    def save_lead(self, lead: Dict[str, Any]) -> int:
+        return self._upsert([lead])[0]
+
+    def save_leads(self, leads: Iterable[Dict[str, Any]]) -> int:
+        return len(self._upsert(list(leads)))
+
+    def _upsert(self, leads: List[Dict[str, Any]]) -> List[int]:
+        created_at = utc_timestamp()
+        ids = []
+        with self._lock:
+            for lead in leads:
+                key = (lead.get('session_id'), lead.get('attempt') or 0)
+                record = self._by_key.get(key) if key[0] != ANONYMOUS_SESSION_ID else None
+                if record is None:
+                    record = {'id': len(self._leads) + 1, 'created_at': created_at}
+                    if key[0] != ANONYMOUS_SESSION_ID:
+                        self._by_key[key] = record
+                    self._leads.append(record)
+                    self._created_at.append(created_at)
+                else:
+                    self._score_counts[record['lead_score']] -= 1
+                    if not self._score_counts[record['lead_score']]:
+                        # Match SQLite's GROUP BY, which has no zero counts
+                        del self._score_counts[record['lead_score']]
+                record.update((column, lead.get(column)) for column in LEAD_INPUT_COLUMNS)
+                self._score_counts[record['lead_score']] = self._score_counts.get(record['lead_score'], 0) + 1
+                ids.append(record['id'])
+        return ids
+
+    def list_leads(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            # Stored in insertion (= created_at) order
+            start = 0 if limit is None else max(0, len(self._leads) - limit)
+            newest = self._leads[start:][::-1]
+            return [{column: lead[column] for column in LEAD_COLUMNS} for lead in newest]
+
+    def lead_stats(self) -> Dict[str, Any]:
+        cutoff = utc_timestamp(datetime.now(timezone.utc) - timedelta(days=7))
+        with self._lock:
+            return {
+                'total_leads': len(self._leads),
+                'leads_by_score': dict(self._score_counts),
+                'recent_leads': len(self._created_at) - bisect.bisect_left(self._created_at, cutoff)
+            }
+
+    def get_rates(self) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return dict(self._rates) if self._rates is not None else None
+
+    def update_rates(self, fixed_rate: float, variable_rate: float, three_year_fixed_rate: float):
+        with self._lock:
+            self._rates = {
+                'fixed_rate': fixed_rate,
+                'variable_rate': variable_rate,
+                'three_year_fixed_rate': three_year_fixed_rate,
+                'updated_at': utc_timestamp()
+            }
+
+
+def check_migration(path: str) -> List[str]:
+    """
+    Run initialize() (and so the unique-key migration) on a copy of the database at path.
+    Returns the problems found: leads lost beyond duplicates of a client session, or
+    anonymous leads that are merged instead of inserted.
+    """
+    problems = []
+    with tempfile.TemporaryDirectory() as directory:
+        copy = os.path.join(directory, os.path.basename(path))
+        shutil.copyfile(path, copy)
+        conn = sqlite3.connect(copy)
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(leads)')}
+        attempt = 'attempt' if 'attempt' in columns else '0'
+        anonymous_before = conn.execute(
+            'SELECT COUNT(*) FROM leads WHERE session_id = ?', (ANONYMOUS_SESSION_ID,)
+        ).fetchone()[0]
+        client_keys_before = conn.execute(
+            f'SELECT COUNT(*) FROM (SELECT DISTINCT session_id, {attempt} FROM leads WHERE session_id != ?)',
+            (ANONYMOUS_SESSION_ID,)
+        ).fetchone()[0]
+        conn.close()
+
+        store = SQLiteLeadStore(copy)
+        store.initialize()
+        conn = store.conn
+        anonymous_after = conn.execute(
+            'SELECT COUNT(*) FROM leads WHERE session_id = ?', (ANONYMOUS_SESSION_ID,)
+        ).fetchone()[0]
+        client_after = conn.execute(
+            'SELECT COUNT(*) FROM leads WHERE session_id != ?', (ANONYMOUS_SESSION_ID,)
+        ).fetchone()[0]
+        if anonymous_after != anonymous_before:
+            problems.append(f"{anonymous_before - anonymous_after} of {anonymous_before} anonymous leads deleted")
+        if client_after != client_keys_before:
+            problems.append(f"{client_after} client session leads kept, expected {client_keys_before}")
+
+        total_before = store.lead_stats()['total_leads']
+        first = store.save_lead({'session_id': ANONYMOUS_SESSION_ID, 'lead_score': 'check'})
+        second = store.save_lead({'session_id': ANONYMOUS_SESSION_ID, 'lead_score': 'check'})
+        stats = store.lead_stats()
+        if first == second or stats['total_leads'] != total_before + 2 or stats['recent_leads'] < 2:
+            problems.append('anonymous leads are merged into one row instead of inserted')
+        conn.close()
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Storage helpers')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    check = subparsers.add_parser('check-migration', help='run the schema migration on a copy of a database')
+    check.add_argument('--db', default=os.getenv('LEADS_DB', 'leads.db'), help='database to copy (left untouched)')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        parser.error(f"{args.db} does not exist")
+    problems = check_migration(args.db)
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    if problems:
+        sys.exit(1)
+    print(f"OK: {args.db} migrates without losing leads")
+
+
+if __name__ == '__main__':
+    main()